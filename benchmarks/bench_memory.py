@@ -0,0 +1,69 @@
+"""
+Measure the memory taken up by the objects of a parsed flow, in bytes per node.
+
+The sheet is made of copies of the rows of the no_switch_nodes test sheet,
+with new row ids, node names and links between the copies.
+
+    python -m benchmarks.bench_memory --copies 2000
+"""
+import argparse
+import gc
+import tracemalloc
+
+from rapidpro.parser import Parser
+from rapidpro.templates import RowTemplateCache
+from rapidpro.utils import get_dict_from_csv
+
+SHEET_PATH = 'inputs/all_test_flows - _no_switch_nodes.csv'
+
+
+def get_synthetic_rows(copies):
+    rows = get_dict_from_csv(SHEET_PATH)
+    row_count = len(rows)
+
+    synthetic_rows = []
+    for i in range(copies):
+        for row in rows:
+            row = dict(row)
+            offset = i * row_count
+            row['row_id'] = str(int(row['row_id']) + offset)
+            if row['from'] == 'start':
+                row['from'] = 'start' if i == 0 else str(offset)
+            else:
+                row['from'] = str(int(row['from']) + offset)
+            row['_nodeId'] = f'{row["_nodeId"]}-{i}'
+            synthetic_rows.append(row)
+    return synthetic_rows
+
+
+def measure(rows, template_cache):
+    # The memory allocated while parsing that is still in use afterwards, i.e. the flow itself
+    gc.collect()
+    tracemalloc.start()
+    parser = Parser(None, sheet_rows=rows, flow_name='memory', keep_rows=False, template_cache=template_cache)
+    parser.parse()
+    # The indexes of the parser aren't part of the flow
+    parser.row_id_to_node_map = parser.node_name_to_node_map = None
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return parser.container, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--copies', type=int, default=2000, help='Number of copies of the test sheet')
+    args = parser.parse_args()
+
+    rows = get_synthetic_rows(args.copies)
+    # The templates are built beforehand, so that they aren't counted
+    template_cache = RowTemplateCache()
+    measure(rows, template_cache)
+
+    container, size = measure(rows, template_cache)
+    node_count = len(container.nodes)
+    print(f'{node_count} nodes, {size / 1024 / 1024:.1f} MB, {size / node_count:.0f} bytes per node')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Compare the serializers in rapidpro.serializers on the all_test_flows export
+and on a synthetic export of a given size.
+
+    python -m benchmarks.bench_serializers --size-mb 100
+"""
+import argparse
+import copy
+import io
+import json
+import time
+from pathlib import Path
+
+from rapidpro.batch import get_export_detail
+from rapidpro.export import ExportWriter
+from rapidpro.serializers import get_available_serializer_names, get_serializer
+
+EXPORT_PATH = Path(__file__).parents[1] / 'outputs' / 'all_test_flows.json'
+
+
+def get_synthetic_export(export, size_mb):
+    # Repeat the flows of the export until its JSON is about size_mb megabytes
+    flows = export['flows']
+    flows_size = len(json.dumps(flows))
+    copies = max(1, int(size_mb * 1024 * 1024 / flows_size))
+
+    synthetic_flows = []
+    for i in range(copies):
+        for flow in flows:
+            flow = copy.copy(flow)
+            flow['name'] = f'{flow["name"]} {i}'
+            synthetic_flows.append(flow)
+    return get_export_detail(synthetic_flows)
+
+
+def time_call(function, repeat):
+    # The best of several runs, in seconds
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run(export, label, repeat):
+    print(f'{label}: {len(json.dumps(export)) / 1024 / 1024:.1f} MB')
+    for name in get_available_serializer_names():
+        serializer = get_serializer(name)
+
+        def write_export():
+            with ExportWriter(io.StringIO(), serializer=serializer) as writer:
+                for flow in export['flows']:
+                    writer.add_flow(flow)
+
+        dumps_time = time_call(lambda: serializer.dumps(export), repeat)
+        writer_time = time_call(write_export, repeat)
+        print(f'  {name:<8} dumps {dumps_time * 1000:9.1f} ms   ExportWriter {writer_time * 1000:9.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=float, default=100, help='Size of the synthetic export')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs, the best of which is reported')
+    args = parser.parse_args()
+
+    with open(EXPORT_PATH) as export_file:
+        export = json.load(export_file)
+
+    run(export, EXPORT_PATH.name, args.repeat)
+    run(get_synthetic_export(export, args.size_mb), 'synthetic export', args.repeat)
+
+
+if __name__ == '__main__':
+    main()
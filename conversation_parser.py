@@ -1,8 +1,13 @@
-import json
 import uuid
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from multiprocessing.util import Finalize
+from pathlib import Path
 
 import openpyxl
 
+from rapidpro.serializers import get_serializer
+
 
 class ReadSheetFromFile:
     destination_uuid = []
@@ -23,21 +28,77 @@ class ReadSheetFromFile:
 
     checked_condition_columns = []
 
-    def __init__(self, path, sheet_name):
-        self.compatible_file = openpyxl.load_workbook(path)
+    def __init__(self, path, sheet_name, workbook=None):
+        # An already opened workbook can be passed in to share it between
+        # sheets (see compile_workbook). In that case the caller closes it.
+        self.compatible_file = workbook or open_workbook(path)
+        self.owns_file = workbook is None
         self.sheet = self.compatible_file[sheet_name]
+        self.node_uuid = {}
+
+        self.header = list(next(self.sheet.iter_rows(max_row=1, values_only=True), ()))
+        self.row_count = 1
+        self.columns = {}
+
+    def load_columns(self, column_numbers):
+        # Read the sheet once and only keep the values of the given columns.
+        # Cells of any other column are dropped while reading.
+        self.columns = {column: [] for column in set(column_numbers)}
+        self.row_count = 1
+
+        for values in self.sheet.iter_rows(min_row=2, values_only=True):
+            for column, column_values in self.columns.items():
+                column_values.append(values[column - 1] if column <= len(values) else None)
+            self.row_count += 1
+
+        if self.owns_file:
+            close_workbook(self.compatible_file)
+
+    def get_cell(self, row, column):
+        if row == 1:
+            return self.header[column - 1] if 0 < column <= len(self.header) else None
+
+        column_values = self.columns.get(column)
+        if column_values is None or not 2 <= row <= self.row_count:
+            return None
+        return column_values[row - 2]
+
+
+def open_workbook(path):
+    # Read-only mode streams the sheet xml instead of building the full
+    # cell model, and data_only gives us the cached values of formulas.
+    # The file is opened here, as openpyxl leaves a file it opened itself open
+    # if a sheet wasn't read to the end. Close the workbook with close_workbook.
+    workbook_file = open(path, 'rb')
+    try:
+        workbook = openpyxl.load_workbook(workbook_file, read_only=True, data_only=True)
+    except BaseException:
+        workbook_file.close()
+        raise
+    workbook.source_file = workbook_file
+    return workbook
+
+
+def close_workbook(workbook):
+    workbook.close()
+    workbook.source_file.close()
+
+
+def is_flow_sheet(sheet):
+    header = next(sheet.iter_rows(max_row=1, values_only=True), ())
+    return 'row_id' in header and 'type' in header
 
 
 def get_maximum_rows():
-    return sheet_reader.sheet.max_row
+    return sheet_reader.row_count
 
 
 def get_maximum_columns():
-    return sheet_reader.sheet.max_column
+    return len(sheet_reader.header)
 
 
 def get_sheet_cell_detail(row, column):
-    return sheet_reader.sheet.cell(row=row, column=column).value
+    return sheet_reader.get_cell(row, column)
 
 
 def generate_uuid():
@@ -105,6 +166,21 @@ def get_required_column_numbers():
         elif not first_row:
             break
 
+    # Column 2 is looked up directly in get_all_nodes_detail
+    sheet_reader.load_columns([
+        column for column in [
+            sheet_reader.row_id_column_number,
+            sheet_reader.type_column_number,
+            sheet_reader.from_column_number,
+            sheet_reader.condition_column_number,
+            sheet_reader.condition_var_column_number,
+            sheet_reader.text_column_number,
+            sheet_reader.media_column_number,
+            sheet_reader.save_name_column_number,
+            2,
+        ] if column
+    ] + sheet_reader.choices_column_numbers)
+
 
 def get_condition_node_detail(row, condition_values, save_name):
     condition_node_detail = {
@@ -368,24 +444,76 @@ def get_detail_in_flows():
     return flows_detail
 
 
-if __name__ == '__main__':
-    sheets = ['example_story1', 'example_media']
+def get_export_detail():
+    return {
+        'campaigns': [],
+        'fields': [],
+        'flows': [],
+        'groups': [],
+        'site': 'https://rapidpro.idems.international',
+        'triggers': [],
+        'version': '13',
+    }
 
-    for sheet_name in sheets:
-        path = '/Users/ehmadzubair/Documents/cogent-labs/software-projects/conversation-parser-project/ehmad_test_chat_flows.xlsx'
-        sheet_reader = ReadSheetFromFile(path, sheet_name)
 
-        complete_sheet_detail = {
-            'campaigns': [],
-            'fields': [],
-            'flows': [],
-            'groups': [],
-            'site': 'https://rapidpro.idems.international',
-            'triggers': [],
-            'version': '13',
-        }
+def compile_sheet(path, name, workbook=None):
+    global sheet_reader, sheet_name
+
+    sheet_name = name
+    sheet_reader = ReadSheetFromFile(path, sheet_name, workbook=workbook)
+    return get_detail_in_flows()
+
+
+def _init_worker(path):
+    # Each worker process opens the workbook once and reuses it for all of its sheets
+    global worker_workbook
+    worker_workbook = open_workbook(path)
+    # Close it when the worker process exits
+    Finalize(worker_workbook, close_workbook, args=(worker_workbook,), exitpriority=10)
+
+
+def _compile_worker_sheet(path, name):
+    return compile_sheet(path, name, workbook=worker_workbook)
+
+
+def compile_workbook(path, sheet_names=None, max_workers=1):
+    """
+    Compile several sheets of a workbook into a single RapidPro export.
+    The workbook is opened only once and shared by all sheets.
+
+    :param path: Path of the xlsx file
+    :param sheet_names: Names of the sheets to compile, in order. If None,
+        every sheet whose header has a row_id and type column is compiled.
+    :param max_workers: Number of processes to compile the sheets in. If 1,
+        the sheets are compiled serially in this process. If None, one
+        process per CPU is used. The flows are in the same order either way.
+    :return: The export dict, containing one flow per sheet
+    """
+    workbook = open_workbook(path)
+    complete_sheet_detail = get_export_detail()
+
+    try:
+        if sheet_names is None:
+            sheet_names = [sheet.title for sheet in workbook.worksheets if is_flow_sheet(sheet)]
+
+        if max_workers == 1:
+            flows = [compile_sheet(path, name, workbook=workbook) for name in sheet_names]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                     initargs=(path,)) as executor:
+                flows = list(executor.map(_compile_worker_sheet, repeat(path), sheet_names))
+    finally:
+        close_workbook(workbook)
+
+    complete_sheet_detail['flows'].extend(flows)
+    return complete_sheet_detail
+
+
+if __name__ == '__main__':
+    sheets = ['example_story1', 'example_media']
+    path = '/Users/ehmadzubair/Documents/cogent-labs/software-projects/conversation-parser-project/ehmad_test_chat_flows.xlsx'
 
-        complete_sheet_detail['flows'].append(get_detail_in_flows())
+    complete_sheet_detail = compile_workbook(path, sheets)
 
-        with open(f'{sheet_name}.json', 'w') as sheet_detail:
-            json.dump(complete_sheet_detail, sheet_detail)
+    with open(f'{Path(path).stem}.json', 'w') as sheet_detail:
+        sheet_detail.write(get_serializer('auto').dumps(complete_sheet_detail))
@@ -1,13 +1,12 @@
 import csv
-import json
 import uuid
 from collections import defaultdict
 
 import openpyxl
 
-from constants import nodes_map
 from models import RapidProGotoNode, RapidProNode, ConditionalRapidProNode, RapidProExit, \
-    SaveNameConditionalRapidProNode, SaveNameNode, SaveNameCollection
+    SaveNameConditionalRapidProNode, SaveNameNode, SaveNameCollection, CompilationContext
+from rapidpro.serializers import get_serializer
 from utils import generate_uuid, find_node_with_row_id_only
 
 debug = True
@@ -15,8 +14,13 @@ debug = True
 
 class ReadSheetFromFile:
 
-    def __init__(self, path):
+    def __init__(self, path, context=None, output=None):
+        """
+        :param output: Text file-like object to print progress to, sys.stdout if None
+        """
         self.path = path
+        self.context = context or CompilationContext()
+        self.output = output
 
     def read_csv(self):
         with open(self.path) as csv_file:
@@ -35,8 +39,9 @@ class ReadSheetFromFile:
                         row['choice_2'],
                         row['choice_3'],
                         row.get('save_name'),
+                        context=self.context,
                     )
-                    nodes_map[row['row_id']] = goto_node
+                    self.context.add_node(goto_node)
                 else:
                     rapidpro_node = RapidProNode(
                         row['row_id'],
@@ -49,21 +54,32 @@ class ReadSheetFromFile:
                         row['choice_2'],
                         row.get('choice_3'),
                         row.get('save_name'),
+                        context=self.context,
                     )
-                    nodes_map[row['row_id']] = rapidpro_node
+                    self.context.add_node(rapidpro_node)
                 line_count += 1
 
-            print(f'Processed {line_count} lines.')
+            print(f'Processed {line_count} lines.', file=self.output)
 
 
 class RapidProParser:
+    def __init__(self, context, serializer=None, output=None):
+        """
+        :param context: CompilationContext holding the nodes to render
+        :param serializer: Serializer from rapidpro.serializers to print the output with
+        :param output: Text file-like object to print the output to, sys.stdout if None
+        """
+        self.context = context
+        self.serializer = serializer or get_serializer()
+        self.output = output
+
     def populate_base_nodes(self):
-        for key, node in nodes_map.items():
+        for key, node in self.context.nodes_map.items():
             node.parse()
 
     def run(self):
         all_nodes = []
-        for key, node in nodes_map.items():
+        for key, node in self.context.nodes_map.items():
 
             node.parse()
             all_nodes.append(node)
@@ -79,10 +95,11 @@ class RapidProParser:
                                                 choice_2=node.choice_2,
                                                 choice_3=node.choice_3,
                                                 save_name=node.save_name,
-                                                base_node=node)
+                                                base_node=node,
+                                                context=self.context)
                 collection.parse()
 
-                next_node = find_node_with_row_id_only(nodes_map=nodes_map, from_row_id=node.row_id)
+                next_node = find_node_with_row_id_only(self.context.node_index, from_row_id=node.row_id)
                 collection.add_collection_exit(destination_uuid=next_node.uuid)
 
                 all_nodes.pop()
@@ -102,43 +119,45 @@ class RapidProParser:
                         choice_2=node.choice_2,
                         choice_3=node.choice_3,
                         save_name=node.save_name,
+                        context=self.context,
                     )
                     conditional_node.parse()
                     all_nodes.append(conditional_node)
 
                     node.add_exit(RapidProExit(conditional_node.uuid))
 
-        print('=======ALL NODES=======')
-        print(json.dumps([node.render() for node in all_nodes if node.type != 'go_to']))
-
-        print('========== RAPID PRO JSON==========')
-        print(json.dumps(
-            {
-                'campaigns': [],
-                'fields': [],
-                'flows': [{
-                    'name': f'some_sheet_name',
-                    'uuid': generate_uuid(),
-                    'spec_version': '13.1.0',
-                    'language': 'base',
-                    'type': 'messaging',
-                    'nodes': [node.render() for node in all_nodes if node.type != 'go_to'],
-                    '_ui': None,
-                    'revision': 0,
-                    'expire_after_minutes': 60,
-                    'metadata': {'revision': 0},
-                    'localization': {}
-                }],
-                'groups': [],
-                'site': 'https://rapidpro.idems.international',
-                'triggers': [],
-                'version': '13',
-            }
-
-        ))
-
-        print('=================== DEBUG ===============')
-        print([node.__class__ for node in all_nodes if node.type != 'go_to'])
+        print('=======ALL NODES=======', file=self.output)
+        print(self.serializer.dumps([node.render() for node in all_nodes if node.type != 'go_to']), file=self.output)
+
+        rapidpro_export = {
+            'campaigns': [],
+            'fields': [],
+            'flows': [{
+                'name': f'some_sheet_name',
+                'uuid': generate_uuid(),
+                'spec_version': '13.1.0',
+                'language': 'base',
+                'type': 'messaging',
+                'nodes': [node.render() for node in all_nodes if node.type != 'go_to'],
+                '_ui': None,
+                'revision': 0,
+                'expire_after_minutes': 60,
+                'metadata': {'revision': 0},
+                'localization': {}
+            }],
+            'groups': [],
+            'site': 'https://rapidpro.idems.international',
+            'triggers': [],
+            'version': '13',
+        }
+
+        print('========== RAPID PRO JSON==========', file=self.output)
+        print(self.serializer.dumps(rapidpro_export), file=self.output)
+
+        print('=================== DEBUG ===============', file=self.output)
+        print([node.__class__ for node in all_nodes if node.type != 'go_to'], file=self.output)
+
+        return rapidpro_export
 
 
 if __name__ == '__main__':
@@ -146,8 +165,9 @@ if __name__ == '__main__':
 
     for sheet_name in sheets:
         path = '/Users/ehmadzubair/Documents/cogent-labs/software-projects/conversation-parser-project/test-spreadsheet - example_media.csv'
-        sheet_reader = ReadSheetFromFile(path)
+        context = CompilationContext()
+        sheet_reader = ReadSheetFromFile(path, context)
         sheet_reader.read_csv()
 
-        parser = RapidProParser()
+        parser = RapidProParser(context)
         parser.run()
@@ -1,4 +1,5 @@
 from collections import defaultdict
+from functools import lru_cache
 from typing import List
 from pydantic import BaseModel
 
@@ -8,6 +9,82 @@ class MockCellParser:
         return value
 
 
+class CellParser:
+    # Turns the string content of a cell into nested lists.
+    # The separators are | ; : in order of precedence, e.g.
+    # 'condition;a|condition_type;has_any_word' becomes
+    # [['condition', 'a'], ['condition_type', 'has_any_word']].
+    # A separator or backslash can be escaped with a backslash, other
+    # backslashes are kept. A value without any separators stays a string.
+    #
+    # Condition and choice cells repeat a lot across rows, so results are
+    # kept in an LRU cache keyed on the raw string. The cached lists are
+    # shared between calls and must not be modified.
+
+    separators = ['|', ';', ':']
+    escape_character = '\\'
+    escaped_characters = separators + [escape_character]
+
+    def __init__(self, cache_size=1024):
+        self._cached_parse = lru_cache(maxsize=cache_size)(self._parse)
+
+    def parse(self, value):
+        if type(value) != str:
+            # Already parsed, e.g. because the cell came from a pre-split source
+            return value
+        return self._cached_parse(value)
+
+    def cache_info(self):
+        # Named tuple with hits, misses, maxsize and currsize
+        return self._cached_parse.cache_info()
+
+    def cache_clear(self):
+        self._cached_parse.cache_clear()
+
+    def _parse(self, value, level=0):
+        for i in range(level, len(self.separators)):
+            parts = self._split(value, self.separators[i])
+            if len(parts) > 1:
+                return [self._parse(part, i + 1) for part in parts]
+        return self._unescape(value)
+
+    def _is_escape(self, value, i):
+        return value[i] == self.escape_character and value[i + 1:i + 2] in self.escaped_characters
+
+    def _split(self, value, separator):
+        # Split value on separator, except where the separator is escaped.
+        # Escapes are kept so that the parts can be split further.
+        if self.escape_character not in value:
+            return value.split(separator)
+
+        parts = []
+        start = 0
+        i = 0
+        while i < len(value):
+            if self._is_escape(value, i):
+                i += 2
+                continue
+            if value[i] == separator:
+                parts.append(value[start:i])
+                start = i + 1
+            i += 1
+        parts.append(value[start:])
+        return parts
+
+    def _unescape(self, value):
+        if self.escape_character not in value:
+            return value
+
+        characters = []
+        i = 0
+        while i < len(value):
+            if self._is_escape(value, i):
+                i += 1
+            characters.append(value[i])
+            i += 1
+        return ''.join(characters)
+
+
 class ParserModel(BaseModel):
 
     def header_name_to_field_name(header):
@@ -23,6 +100,13 @@ class ParserModel(BaseModel):
         # This is used for models representing a full sheet row.
         return header
 
+    def header_name_to_field_name_context(row):
+        # The part of the row that header_name_to_field_name_with_context
+        # depends on. The header mapping is only computed once for each
+        # distinct combination of headers and context, so models whose
+        # mapping depends on the row must override this.
+        return None
+
 
 def is_list_type(model):
     # Determine whether model is a list type,
@@ -46,6 +130,138 @@ def is_basic_type(model):
     return model in [str, int, float, bool]
 
 
+# Kinds of models, see get_model_kind
+MODEL = 'model'
+LIST = 'list'
+BASIC = 'basic'
+
+
+@lru_cache(maxsize=None)
+def get_model_kind(model):
+    # Resolve the type checks for a model once per process.
+    # Models are classes or typing constructs like List[str], which are hashable.
+    if is_parser_model_type(model):
+        return MODEL
+    if is_list_type(model):
+        return LIST
+    return BASIC
+
+
+@lru_cache(maxsize=None)
+def get_model_field_names(model):
+    # Note: The fields have a well defined ordering.
+    # See https://pydantic-docs.helpmanual.io/usage/models/#field-ordering
+    return tuple(model.__fields__.keys())
+
+
+class AssignmentPlan:
+    # The path from a model to one of its (nested) fields, with the field
+    # lookups and type checks along the path resolved up front.
+    # Running the plan on an output object finds (and if necessary creates)
+    # the destination field, see RowParser.find_entry.
+
+    def __init__(self, model, field_path):
+        # Each step is a tuple (key, is_list_index, child_kind)
+        self.steps = []
+        for field_name in field_path:
+            kind = get_model_kind(model)
+            if kind == LIST:
+                # Get the type that's inside the list
+                assert len(model.__args__) == 1
+                child_model = model.__args__[0]
+                key = int(field_name) - 1
+            else:
+                assert kind == MODEL
+                key = model.header_name_to_field_name(field_name)
+                if not key in model.__fields__:
+                    raise ValueError(f"Field {key} doesn't exist in target type.")
+                child_model = model.__fields__[key].outer_type_
+                # TODO: how does ModelField.outer_type_ and ModelField.type_
+                # deal with nested lists, e.g. List[List[str]]?
+                # Write test cases and fix code.
+            self.steps.append((key, kind == LIST, get_model_kind(child_model)))
+            model = child_model
+
+        # The model/type of the destination field
+        self.model = model
+        self.kind = get_model_kind(model)
+
+    def find_entry(self, output_field):
+        last_step = len(self.steps) - 1
+        for depth, (key, is_list_index, child_kind) in enumerate(self.steps):
+            if is_list_index:
+                if len(output_field) <= key:
+                    # Create a new list entry for this, if necessary
+                    # We assume the columns are always in order 1, 2, 3, ... for now
+                    assert len(output_field) == key
+                    # None will later be overwritten by assign_value
+                    output_field.append(None)
+            elif not key in output_field:
+                # Create a new entry for this, if necessary
+                # None will later be overwritten by assign_value
+                output_field[key] = None
+
+            if depth == last_step:
+                # We're reach the end of the field_path
+                # Therefore we've found where we need to assign
+                return output_field, key
+
+            # The field has subfields, keep going.
+            # If field doesn't exist yet in our output object, create it.
+            if child_kind == LIST and output_field[key] is None:
+                output_field[key] = []
+            elif child_kind == MODEL and output_field[key] is None:
+                output_field[key] = {}
+            output_field = output_field[key]
+
+
+# Assignment plans by (model, field_path), shared by all RowParsers
+assignment_plans = {}
+
+
+def get_assignment_plan(model, field_path):
+    key = (model, tuple(field_path))
+    plan = assignment_plans.get(key)
+    if plan is None:
+        plan = AssignmentPlan(model, field_path)
+        assignment_plans[key] = plan
+    return plan
+
+
+class RowSchema:
+    # The mapping from the column headers of a row to field paths in the model,
+    # compiled once and then reused for every row with the same headers.
+
+    def __init__(self, model, headers, row):
+        # Apply map from header string to field specification.
+        # If two headers map to the same field, the later one wins.
+        field_name_to_header = {}
+        for header in headers:
+            field_name = model.header_name_to_field_name_with_context(header, row)
+            field_name_to_header[field_name] = header
+
+        # Each column is a tuple (header, field_path, asterisk_prefix), where
+        # asterisk_prefix is None unless the field name contains an asterisk (*).
+        self.columns = []
+        for field_name, header in field_name_to_header.items():
+            prefix = field_name.split('*')[0] if '*' in field_name else None
+            self.columns.append((header, field_name, prefix))
+
+        self.has_asterisks = any(prefix is not None for _, _, prefix in self.columns)
+        self.field_paths = {}
+
+    def get_field_path(self, field_name, index=None):
+        # Split field_name into its path, replacing the asterisk with index + 1
+        key = (field_name, index)
+        field_path = self.field_paths.get(key)
+        if field_path is None:
+            if index is not None:
+                field_name = field_name.replace('*', str(index + 1))
+            field_path = tuple(field_name.split(':'))
+            self.field_paths[key] = field_path
+        return field_path
+
+
 class RowParser:
     # Takes a dictionary of cell entries, whose keys are the column names
     # and the values are the cell content converted into nested lists.
@@ -55,6 +271,15 @@ class RowParser:
         self.model = model
         self.output = None  # Gets reinitialized with each call to parse_row
         self.cell_parser = cell_parser
+        self.schemas = {}
+
+    def get_schema(self, data):
+        key = (tuple(data), self.model.header_name_to_field_name_context(data))
+        schema = self.schemas.get(key)
+        if schema is None:
+            schema = RowSchema(self.model, data, data)
+            self.schemas[key] = schema
+        return schema
 
     def try_assign_as_kwarg(self, field, key, value, model):
         # If value can be interpreted as a (field, field_value) pair for a field of model,
@@ -78,13 +303,12 @@ class RowParser:
 
         # Using both key and field here because if we passed field[key],
         # we can't do call by reference with basic types.
-        if is_parser_model_type(model):
+        kind = get_model_kind(model)
+        if kind == MODEL:
             # The value should be a dict/object
             field[key] = {}
             # Get the list of keys that are available for the target model
-            # Note: The fields have a well defined ordering.
-            # See https://pydantic-docs.helpmanual.io/usage/models/#field-ordering
-            model_fields = list(model.__fields__.keys())
+            model_fields = get_model_field_names(model)
 
             if type(value) != list:
                 # It could be that an object is specified via a single element.
@@ -110,7 +334,7 @@ class RowParser:
                     entry_key = model_fields[i]
                     self.assign_value(field[key], entry_key, entry, model.__fields__[entry_key].outer_type_)
 
-        elif is_list_type(model):
+        elif kind == LIST:
             # Get the type that's inside the list
             assert len(model.__args__) == 1
             child_model = model.__args__[0]
@@ -143,58 +367,23 @@ class RowParser:
         # traverse the path in output_field and if necessary create non-existent
         # entries.
 
-        # We're creating the output object's fields as we're going through it.
-        # It'd be nicer to already have a template.
-        field_name = field_path[0]
-        if is_list_type(model):
-            # Get the type that's inside the list
-            assert len(model.__args__) == 1
-            child_model = model.__args__[0]
-
-            index = int(field_name) - 1
-            if len(output_field) <= index:
-                # Create a new list entry for this, if necessary
-                # We assume the columns are always in order 1, 2, 3, ... for now
-                assert len(output_field) == index
-                # None will later be overwritten by assign_value
-                output_field.append(None)
-
-            key = index
-        else:
-            assert is_parser_model_type(model)
-            key = model.header_name_to_field_name(field_name)
-            if not key in model.__fields__:
-                raise ValueError(f"Field {key} doesn't exist in target type.")
-            child_model = model.__fields__[key].outer_type_
-            # TODO: how does ModelField.outer_type_ and ModelField.type_
-            # deal with nested lists, e.g. List[List[str]]?
-            # Write test cases and fix code.
-
-            if not key in output_field:
-                # Create a new entry for this, if necessary
-                # None will later be overwritten by assign_value
-                output_field[key] = None
-
-        if len(field_path) == 1:
-            # We're reach the end of the field_path
-            # Therefore we've found where we need to assign
-            return output_field, key, child_model
-        else:
-            # The field has subfields, keep going and recurse.
-            # If field doesn't exist yet in our output object, create it.
-            if is_list_type(child_model) and output_field[key] is None:
-                output_field[key] = []
-            elif is_parser_model_type(child_model) and output_field[key] is None:
-                output_field[key] = {}
-            # recurse
-            return self.find_entry(child_model, output_field[key], field_path[1:])
+        # The traversal of the model is only worked out once for each
+        # model and field_path (see AssignmentPlan).
+        plan = get_assignment_plan(model, field_path)
+        field, key = plan.find_entry(output_field)
+        return field, key, plan.model
 
     def parse_entry(self, column_name, value):
         # This creates/populates a field in self.output
         # The field is determined by column_name, its value by value
-        field_path = column_name.split(':')
+        self.parse_field_path(column_name.split(':'), value)
+
+    def parse_field_path(self, field_path, value, parsed=False):
+        # parsed is True if value has been through the cell parser already.
         # Find the destination subfield in self.output that corresponds to field_path
-        field, key, model = self.find_entry(self.model, self.output, field_path)
+        plan = get_assignment_plan(self.model, field_path)
+        field, key = plan.find_entry(self.output)
+        model = plan.model
         # The destination field in self.output is field[key], its type is model.
         # Therefore the value should be assigned to field[key].
         # (Note: This is a bit awkward; if we returned field[key] itself, we could
@@ -202,7 +391,7 @@ class RowParser:
         # Ideally we would return a pointer to the destination field.
         # The model of field[key] is model, and thus value should also be interpreted
         # as being of type model.
-        if is_list_type(model) or is_parser_model_type(model):
+        if plan.kind != BASIC and not parsed:
             # If the expected type of the value is list/object,
             # parse the cell content as such.
             # Otherwise leave it as a string
@@ -220,36 +409,38 @@ class RowParser:
         # Initialize the output template as a dict
         self.output = {}
 
-        # Apply map from header string to field specification
-        data_rekeyed = {}
-        for k, v in data.items():
-            k = self.model.header_name_to_field_name_with_context(k, data)
-            data_rekeyed[k] = v
-        data = data_rekeyed
+        # The header to field mapping is only worked out for the first
+        # row with a given set of headers (see RowSchema)
+        schema = self.get_schema(data)
 
         # For each column with an asterisk (*) (indicating list of fields),
         # Compute how long the implied list is by taking the maximum
         # over the lengths of all fields that this list refers to.
         # Note: So far, no nested asterisks are supported.
+        # Cells of asterisk columns are lists, so they are parsed as such.
         asterisk_list_lengths = defaultdict(lambda: 1)
-        for k,v in data.items():
-            if '*' in k and type(v) == list:
-                prefix = k.split('*')[0]
-                asterisk_list_lengths[prefix] = max(asterisk_list_lengths[prefix], len(v))
+        asterisk_values = {}
+        if schema.has_asterisks:
+            for header, _, prefix in schema.columns:
+                if prefix is not None:
+                    v = self.cell_parser.parse(data[header])
+                    asterisk_values[header] = v
+                    if type(v) == list:
+                        asterisk_list_lengths[prefix] = max(asterisk_list_lengths[prefix], len(v))
         # Process each entry
-        for k,v in data.items():
-            if '*' in k:
+        for header, field_name, prefix in schema.columns:
+            if prefix is not None:
+                v = asterisk_values[header]
                 # Process each prefix:*:suffix column entry by assigning the individual
                 # list values to prefix:1:suffix, prefix:2:suffix, etc
-                prefix = k.split('*')[0]
                 if type(v) != list:
                     v = [v]*asterisk_list_lengths[prefix]
                 for i, elem in enumerate(v):
-                    self.parse_entry(k.replace('*', str(i+1)), elem)
+                    # The cell has been parsed above, parsing its elements again would undo escapes
+                    self.parse_field_path(schema.get_field_path(field_name, i), elem, parsed=True)
             else:
                 # Normal, non-* column entry.
-                self.parse_entry(k,v)
+                self.parse_field_path(schema.get_field_path(field_name), data[header])
         # Returning an instance of the model rather than the output directly
         # helps us fill in default values where no entries exist.
         return self.model(**self.output)
-
@@ -24,6 +24,29 @@ class ConditionalFrom(ParserModel):
     condition: Condition = Condition()
 
 
+basic_header_dict = {
+    "from" : "conditional_from:*:row_id",
+    "condition_value" : "conditional_from:*:condition:value",
+    "condition_var" : "conditional_from:*:condition:var",
+    "condition_type" : "conditional_from:*:condition:type",
+    "condition_name" : "conditional_from:*:condition:name",
+}
+
+row_type_to_main_arg = {
+    "send_message" : "mainarg_message_text",
+    "save_value" : "mainarg_value",
+    "add_to_group" : "mainarg_group",
+    "remove_from_group" : "mainarg_group",
+    "save_flow_result" : "mainarg_flowresult",
+    "wait_for_response" : "mainarg_none",
+    "split_random" : "mainarg_none",
+    "go_to" : "mainarg_destination_row_ids",
+    "start_new_flow" : "mainarg_flow_name",
+    "split_by_value" : "mainarg_expression",
+    "split_by_group" : "mainarg_group",
+}
+
+
 class RowData(ParserModel):
     row_id: str
     type: str
@@ -63,30 +86,11 @@ class RowData(ParserModel):
         }
         return field_map.get(header, header)
 
-    def header_name_to_field_name_with_context(header, row):
-        # TODO: This should be defined outside of this function
-        basic_header_dict = {
-            "from" : "conditional_from:*:row_id",
-            "condition_value" : "conditional_from:*:condition:value",
-            "condition_var" : "conditional_from:*:condition:var",
-            "condition_type" : "conditional_from:*:condition:type",
-            "condition_name" : "conditional_from:*:condition:name",
-        }
-
-        row_type_to_main_arg = {
-            "send_message" : "mainarg_message_text",
-            "save_value" : "mainarg_value",
-            "add_to_group" : "mainarg_group",
-            "remove_from_group" : "mainarg_group",
-            "save_flow_result" : "mainarg_flowresult",
-            "wait_for_response" : "mainarg_none",
-            "split_random" : "mainarg_none",
-            "go_to" : "mainarg_destination_row_ids",
-            "start_new_flow" : "mainarg_flow_name",
-            "split_by_value" : "mainarg_expression",
-            "split_by_group" : "mainarg_group",
-        }
+    def header_name_to_field_name_context(row):
+        # message_text is mapped according to the row type
+        return row["type"]
 
+    def header_name_to_field_name_with_context(header, row):
         if header in basic_header_dict:
             return basic_header_dict[header]
         if header == "message_text":
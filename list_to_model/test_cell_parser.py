@@ -0,0 +1,68 @@
+import unittest
+
+from list_to_model import CellParser, RowParser
+from models import FromWrong
+
+
+class TestCellParser(unittest.TestCase):
+
+    def setUp(self):
+        self.cell_parser = CellParser(cache_size=2)
+
+    def test_nested_lists(self):
+        self.assertEqual(self.cell_parser.parse('a'), 'a')
+        self.assertEqual(self.cell_parser.parse('a;b'), ['a', 'b'])
+        self.assertEqual(self.cell_parser.parse('340;'), ['340', ''])
+        self.assertEqual(
+            self.cell_parser.parse('condition;a|condition_type;has_any_word|condition_name;A'),
+            [['condition', 'a'], ['condition_type', 'has_any_word'], ['condition_name', 'A']])
+        self.assertEqual(self.cell_parser.parse('1:2;3|4'), [[['1', '2'], '3'], '4'])
+
+    def test_escapes(self):
+        self.assertEqual(self.cell_parser.parse(r'a\;b;c'), ['a;b', 'c'])
+        self.assertEqual(self.cell_parser.parse(r'a\|b|c\\'), ['a|b', 'c\\'])
+        self.assertEqual(self.cell_parser.parse(r'a\nb;c'), [r'a\nb', 'c'])
+
+    def test_already_parsed(self):
+        self.assertEqual(self.cell_parser.parse(['a', 'b']), ['a', 'b'])
+
+    def test_cache(self):
+        self.cell_parser.parse('a;b')
+        self.cell_parser.parse('a;b')
+        self.cell_parser.parse('c;d')
+        self.cell_parser.parse('e;f')
+        self.cell_parser.parse('a;b')
+
+        cache_info = self.cell_parser.cache_info()
+        self.assertEqual(cache_info.hits, 1)
+        self.assertEqual(cache_info.misses, 4)
+        self.assertEqual(cache_info.currsize, 2)
+
+    def test_row_parser(self):
+        parser = RowParser(FromWrong, self.cell_parser)
+        output = parser.parse_row({
+            'row_id': '5',
+            'conditions:*:value': '1;2',
+            'conditions:*:type': 'has_phrase',
+            'conditions:*:name': 'A;B',
+        })
+        self.assertEqual(output.dict(), {
+            'row_id': '5',
+            'conditions': [
+                {'value': '1', 'var': '', 'type': 'has_phrase', 'name': 'A'},
+                {'value': '2', 'var': '', 'type': 'has_phrase', 'name': 'B'},
+            ]
+        })
+
+    def test_asterisk_values_are_parsed_once(self):
+        parser = RowParser(FromWrong, self.cell_parser)
+        output = parser.parse_row({
+            'row_id': '5',
+            'conditions:*': r'a\;b;c',
+        })
+        self.assertEqual([{'value': 'a;b', 'var': '', 'type': '', 'name': ''},
+                          {'value': 'c', 'var': '', 'type': '', 'name': ''}], output.dict()['conditions'])
+
+
+if __name__ == '__main__':
+    unittest.main()
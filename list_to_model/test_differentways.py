@@ -1,7 +1,7 @@
 import unittest
 import json
 
-from list_to_model import RowParser, MockCellParser
+from list_to_model import RowParser, MockCellParser, assignment_plans
 from models import FromWrong
 
 
@@ -119,6 +119,15 @@ class TestDifferentWays(unittest.TestCase):
         output_single_kwarg = self.parser.parse_row(input_single_kwarg)
         self.assertEqual(output_single_kwarg, output_single_kwarg_exp)
 
+    def test_assignment_plans_reused(self):
+        self.parser.parse_row(input9)
+        plans = dict(assignment_plans)
+
+        # Parsing the same columns again doesn't create any new plans
+        self.parser.parse_row(input9)
+        self.assertEqual(plans, assignment_plans)
+        self.assertIn((FromWrong, ('conditions', '1', 'value')), assignment_plans)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -185,6 +185,13 @@ class TestDifferentWays(unittest.TestCase):
         output6 = self.parser.parse_row(input6)
         self.assertEqual(output6, output6_exp)
 
+    def test_schema_reuse(self):
+        # Rows with the same headers and type share a compiled schema,
+        # message_text is mapped differently for each row type.
+        outputs = [self.parser.parse_row(inp) for inp in [input1, input1, input4, input4]]
+        self.assertEqual(outputs, [output1_exp, output1_exp, output4_exp, output4_exp])
+        self.assertEqual(len(self.parser.schemas), 2)
+
 
 if __name__ == '__main__':
     unittest.main()
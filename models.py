@@ -1,8 +1,30 @@
 from collections import defaultdict
 
-from constants import excel_to_json_type_map, nodes_map
-from rapidpro.utils import get_separators
-from utils import generate_uuid, find_node
+from constants import excel_to_json_type_map
+from rapidpro.utils import split_cell_value
+from utils import generate_uuid, find_node, NodeIndex
+
+
+class CompilationContext:
+    # State of a single compilation by the v2 engine. Every compilation gets
+    # its own context, which is passed to the reader, the parser and the nodes,
+    # so that compilations can run back-to-back or in parallel threads.
+
+    def __init__(self):
+        # Nodes created from the sheet rows, by row_id
+        self.nodes_map = defaultdict()
+        self._node_index = None
+
+    def add_node(self, node):
+        self.nodes_map[node.row_id] = node
+        self._node_index = None
+
+    @property
+    def node_index(self):
+        # Built once all the nodes have been added, see utils.NodeIndex
+        if self._node_index is None:
+            self._node_index = NodeIndex(self.nodes_map)
+        return self._node_index
 
 
 class RapidProNodeAction:
@@ -127,7 +149,9 @@ class SaveNameRapidProRouter(RapidProRouter):
 
 
 class RapidProNode:
-    def __init__(self, row_id, type, _from, condition, message_text, media, choice_1, choice_2, choice_3, save_name):
+    def __init__(self, row_id, type, _from, condition, message_text, media, choice_1, choice_2, choice_3, save_name,
+                 context):
+        self.context = context
 
         # Excel Sheet
         self.uuid = generate_uuid()
@@ -169,7 +193,7 @@ class RapidProNode:
             self.exits = [RapidProExit(destination_uuid=destination_uuid)]
 
     def _get_destination_nodes(self):
-        return [node for _, node in nodes_map.items() if node._from == self.row_id]
+        return self.context.node_index.nodes_by_from.get(self.row_id, [])
 
     def add_exit(self, rapidpro_exit):
         if type(self) in [ConditionalRapidProNode, SaveNameConditionalRapidProNode]:
@@ -209,7 +233,7 @@ class ConditionalRapidProNode(RapidProNode):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.used_conditions = set([node.condition for _, node in nodes_map.items() if node.condition])
+        self.used_conditions = self.context.node_index.used_conditions
         # Update default category UUID here
 
     def _populate_router(self):
@@ -255,7 +279,7 @@ class ConditionalRapidProNode(RapidProNode):
             if category.name == 'All Responses':
                 destination_uuid = None
             else:
-                next_node = find_node(nodes_map, self.row_id, condition=category.name)
+                next_node = find_node(self.context.node_index, self.row_id, condition=category.name)
 
                 if next_node.type == 'go_to':
                     destination_uuid = next_node.get_destination_node().uuid
@@ -301,7 +325,7 @@ class SaveNameConditionalRapidProNode(ConditionalRapidProNode):
 
 class RapidProGotoNode(RapidProNode):
     def get_destination_node(self):
-        return nodes_map[self.message_text]
+        return self.context.nodes_map[self.message_text]
 
 
 class SaveNameNode(RapidProNode):
@@ -347,6 +371,7 @@ class SaveNameCollection(RapidProNode):
             choice_2=self.choice_2,
             choice_3=self.choice_3,
             save_name=self.save_name,
+            context=self.context,
         )
         self.save_name_conditional_node.parse()
         self.base_node.update_or_create_first_exit(destination_uuid=self.save_name_conditional_node.uuid)
@@ -361,7 +386,8 @@ class SaveNameCollection(RapidProNode):
             choice_1=self.choice_1,
             choice_2=self.choice_2,
             choice_3=self.choice_3,
-            save_name=self.save_name, )
+            save_name=self.save_name,
+            context=self.context, )
 
         self.save_name_node.parse()
         self.save_name_conditional_node.patch_first_exit(self.save_name_node.uuid)
@@ -378,6 +404,7 @@ class SaveNameCollection(RapidProNode):
                 choice_2=self.choice_2,
                 choice_3=self.choice_3,
                 save_name=self.save_name,
+                context=self.context,
             )
             self.conditional_node.parse()
             self.save_name_node.add_exit(RapidProExit(destination_uuid=self.conditional_node.uuid))
@@ -400,17 +427,10 @@ class Row:
     def get_conditions(self):
         conditions = []
 
-        s1, _, _ = get_separators(self.row['condition'])
-        condition_values = self.row['condition'].split(s1)
-
-        s1, _, _ = get_separators(self.row['condition_var'])
-        condition_var_values = self.row['condition_var'].split(s1)
-
-        s1, _, _ = get_separators(self.row['condition_type'])
-        condition_type_values = self.row['condition_type'].split(s1)
-
-        s1, _, _ = get_separators(self.row['condition_name'])
-        condition_name_values = self.row['condition_name'].split(s1)
+        condition_values = split_cell_value(self.row['condition'])
+        condition_var_values = split_cell_value(self.row['condition_var'])
+        condition_type_values = split_cell_value(self.row['condition_type'])
+        condition_name_values = split_cell_value(self.row['condition_name'])
 
         max_length = max(len(condition_values), len(condition_var_values), len(condition_type_values),
                          len(condition_name_values))
@@ -1,6 +1,6 @@
 import re
 
-from rapidpro.utils import get_dict_from_csv, get_separators
+from rapidpro.utils import get_dict_from_csv, parse_cell_value, split_cell_value
 
 
 class GenericParser:
@@ -20,11 +20,7 @@ class GenericParser:
         list_of_objects_columns = re.findall('condition[:a-z0-9]*', column_names)
 
         if object_of_list_columns:
-            num_objects =
-
-
-
-            num_objects = len(row[object_of_list_columns[0].split(';')])
+            num_objects = len(split_cell_value(row[object_of_list_columns[0]]))
             objects = []
             for i in range(num_objects):
                 objects.append({
@@ -37,9 +33,7 @@ class GenericParser:
         pass
 
     def _parse_cell_value(self, value):
-        for separator in get_separators(value):
-            if separator:
-                pass
+        return parse_cell_value(value)
 
     def parse(self):
         for row in self.sheet_rows:
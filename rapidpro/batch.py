@@ -0,0 +1,91 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+
+from rapidpro.cache import get_file_key
+from rapidpro.parser import Parser
+from rapidpro.utils import get_csv_path, iter_dict_from_csv, set_uuid_strategy, reset_uuid_strategy
+
+
+def get_export_detail(flows):
+    return {
+        'campaigns': [],
+        'fields': [],
+        'flows': flows,
+        'groups': [],
+        'site': 'https://rapidpro.idems.international',
+        'triggers': [],
+        'version': '13',
+    }
+
+
+def compile_flow(csv_file_path, flow_name=None, uuid_strategy=None, template_cache=None):
+    # The flow is named after the csv file unless a name is given
+    flow_name = flow_name or Path(csv_file_path).stem
+    token = set_uuid_strategy(uuid_strategy) if uuid_strategy else None
+    try:
+        parser = Parser(None, sheet_rows=iter_dict_from_csv(csv_file_path), flow_name=flow_name, keep_rows=False,
+                        template_cache=template_cache)
+        parser.parse()
+        return parser.container.render()
+    finally:
+        if token:
+            reset_uuid_strategy(token)
+
+
+def compile_flows(csv_file_paths, flow_names=None, max_workers=1, uuid_strategy=None, cache=None,
+                  template_cache=None):
+    """
+    Compile several csv sheets into a single RapidPro export.
+
+    :param csv_file_paths: Paths of the csv files, one flow per file
+    :param flow_names: Names of the flows, one per csv file and in the same order as csv_file_paths.
+        If None, each flow is named after its csv file.
+    :param max_workers: Number of processes to compile the flows in. If 1,
+        the flows are compiled serially in this process. If None, one
+        process per CPU is used. The flows are in the same order either way.
+    :param uuid_strategy: Strategy to generate the UUIDs with (see rapidpro.utils),
+        or None to use the current one. As the strategy is not shared between
+        processes, pass it here rather than calling set_uuid_strategy when
+        compiling in several processes.
+    :param cache: CompileCache to look the flows up in before compiling them,
+        and to store the compiled flows in. Only the flows that are not in
+        the cache are compiled.
+    :param template_cache: RowTemplateCache shared by the flows that are compiled
+        serially in this process, or None to not use one
+    :return: The export dict, containing the rendered flows
+    """
+    csv_file_paths = list(csv_file_paths)
+    if flow_names is None:
+        flow_names = [None] * len(csv_file_paths)
+    else:
+        flow_names = list(flow_names)
+        if len(flow_names) != len(csv_file_paths):
+            raise ValueError(f'Got {len(flow_names)} flow names for {len(csv_file_paths)} csv files')
+    flow_names = [flow_name or Path(csv_file_path).stem
+                  for csv_file_path, flow_name in zip(csv_file_paths, flow_names)]
+
+    flows = [None] * len(csv_file_paths)
+    keys = [None] * len(csv_file_paths)
+    if cache:
+        for i, (csv_file_path, flow_name) in enumerate(zip(csv_file_paths, flow_names)):
+            keys[i] = get_file_key(get_csv_path(csv_file_path), flow_name, uuid_strategy)
+            flows[i] = cache.get(keys[i])
+
+    missing = [i for i, flow in enumerate(flows) if flow is None]
+    missing_paths = [csv_file_paths[i] for i in missing]
+    missing_names = [flow_names[i] for i in missing]
+
+    if max_workers == 1 or len(missing) <= 1:
+        compiled_flows = list(map(compile_flow, missing_paths, missing_names, repeat(uuid_strategy),
+                                  repeat(template_cache)))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            compiled_flows = list(executor.map(compile_flow, missing_paths, missing_names, repeat(uuid_strategy)))
+
+    for i, flow in zip(missing, compiled_flows):
+        flows[i] = flow
+        if cache:
+            cache.put(keys[i], flow)
+
+    return get_export_detail(flows)
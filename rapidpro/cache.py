@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from rapidpro.utils import current_uuid_strategy, get_csv_path
+
+# Change this whenever a change to the compiler changes its output, so that
+# flows compiled by an older version are no longer found in the cache.
+COMPILER_VERSION = '3'
+
+
+def get_strategy_key(uuid_strategy):
+    # What the UUIDs of a flow depend on, besides its rows: the type of the
+    # strategy and, for DeterministicUuidStrategy, its namespace
+    namespace = getattr(uuid_strategy, 'namespace', None)
+    return [type(uuid_strategy).__name__, str(namespace) if namespace is not None else None]
+
+
+def get_sheet_key(rows, flow_name, uuid_strategy=None):
+    """
+    Hash of everything the rendered flow depends on: the rows of the sheet,
+    the flow name, the UUID strategy and the compiler version.
+
+    The rows are normalised by sorting their columns, so that reordering the
+    columns of a sheet doesn't change its key.
+    """
+    uuid_strategy = uuid_strategy or current_uuid_strategy.get()
+    sheet_hash = hashlib.sha256()
+    sheet_hash.update(json.dumps([COMPILER_VERSION, flow_name, *get_strategy_key(uuid_strategy)]).encode('utf-8'))
+    for row in rows:
+        sheet_hash.update(json.dumps(sorted(row.items())).encode('utf-8'))
+    return sheet_hash.hexdigest()
+
+
+def get_file_key(csv_file_path, flow_name, uuid_strategy=None, chunk_size=1024 * 1024):
+    """
+    Like get_sheet_key, but hashes the bytes of the csv file as they are read,
+    without parsing the file. Reordering the columns of the file changes its key.
+    Relative paths are relative to the root of the repository, as in compile_flow.
+    """
+    uuid_strategy = uuid_strategy or current_uuid_strategy.get()
+    file_hash = hashlib.sha256()
+    file_hash.update(json.dumps([COMPILER_VERSION, flow_name, *get_strategy_key(uuid_strategy)]).encode('utf-8'))
+    with open(get_csv_path(csv_file_path), 'rb') as csv_file:
+        for chunk in iter(lambda: csv_file.read(chunk_size), b''):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+class CompileCache:
+    """
+    Cache of rendered flows on disk, one JSON file per key (see get_sheet_key).
+
+    The least recently used flows are removed once the files take up more than
+    max_size bytes, until they take up evict_ratio of max_size, so that the
+    directory is only scanned once in a while. Reading a flow counts as using
+    it, which is recorded in the modification time of its file, so the order
+    is kept between runs.
+
+    Note that a flow read from the cache has the UUIDs of the compilation that
+    stored it, whichever UUID strategy is used.
+    """
+
+    def __init__(self, cache_dir, max_size=256 * 1024 * 1024, evict_ratio=0.9):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.evict_ratio = evict_ratio
+        # Kept up to date by put, and recounted by evict in case other processes use the directory
+        self.total_size = sum(size for _, size, _ in self._scan())
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _get_path(self, key):
+        return self.cache_dir / f'{key}.json'
+
+    @staticmethod
+    def _touch(path):
+        # The clock of the file system can be too coarse to tell apart uses in quick succession
+        now = time.time_ns()
+        os.utime(path, ns=(now, now))
+
+    def get(self, key):
+        # Returns the rendered flow, or None if it isn't in the cache
+        path = self._get_path(key)
+        try:
+            with open(path) as flow_file:
+                flow = json.load(flow_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.misses += 1
+            return None
+
+        self._touch(path)
+        self.hits += 1
+        return flow
+
+    def put(self, key, flow):
+        # Write to a temporary file first, so that other processes never read a partial file
+        path = self._get_path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as tmp_file:
+                json.dump(flow, tmp_file)
+            size = os.path.getsize(tmp_path)
+            try:
+                self.total_size -= path.stat().st_size
+            except FileNotFoundError:
+                pass
+            os.replace(tmp_path, path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+        self._touch(path)
+        self.total_size += size
+
+        if self.total_size > self.max_size:
+            self.evict()
+
+    def _scan(self):
+        entries = []
+        for path in self.cache_dir.glob('*.json'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+        return entries
+
+    def evict(self):
+        entries = self._scan()
+        self.total_size = sum(size for _, size, _ in entries)
+        if self.total_size <= self.max_size:
+            return
+
+        for _, size, path in sorted(entries):
+            if self.total_size <= self.max_size * self.evict_ratio:
+                break
+            path.unlink(missing_ok=True)
+            self.total_size -= size
+            self.evictions += 1
+
+    def clear(self):
+        for path in self.cache_dir.glob('*.json'):
+            path.unlink(missing_ok=True)
+        self.total_size = 0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
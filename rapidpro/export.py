@@ -0,0 +1,108 @@
+from rapidpro.batch import get_export_detail
+from rapidpro.models.common import caching_renders
+from rapidpro.serializers import get_serializer
+
+
+def iter_flow_json(container, serializer=None):
+    # Yield the JSON of a flow in chunks, rendering one node at a time.
+    # The chunks add up to serializer.dumps(container.render()).
+    # Renders are never cached here, so only one node is kept in memory at a time.
+    serializer = serializer or get_serializer()
+    dumps, item_separator, key_separator = serializer.dumps, serializer.item_separator, serializer.key_separator
+
+    yield '{'
+    for key, value in container.render_header().items():
+        yield f'{dumps(key)}{key_separator}{dumps(value)}{item_separator}'
+    yield f'"nodes"{key_separator}['
+    for i, node in enumerate(container.nodes):
+        if i:
+            yield item_separator
+        with caching_renders(False):
+            node_json = dumps(node.render())
+        yield node_json
+    yield ']}'
+
+
+def write_flow(container, fp, serializer=None):
+    """
+    Write the JSON of a flow to a file-like object, without rendering the whole flow at once.
+
+    :param container: Container of the flow
+    :param fp: Text file-like object to write to
+    :param serializer: Serializer from rapidpro.serializers, the standard library if None
+    """
+    for chunk in iter_flow_json(container, serializer):
+        fp.write(chunk)
+
+
+class ExportWriter:
+    """
+    Writes a RapidPro export to a file-like object, one flow at a time.
+
+    The output is the same as serializer.dumps(get_export_detail(flows)). Fields
+    come before the flows in an export, so they are given up front, while
+    groups come after them and can be added at any time before close.
+
+        with open(path, 'w') as fp, ExportWriter(fp) as writer:
+            for container in containers:
+                writer.add_flow(container)
+    """
+
+    def __init__(self, fp, fields=None, serializer=None):
+        self.fp = fp
+        self.serializer = serializer or get_serializer()
+        self.groups = []
+        self.flow_count = 0
+        self.closed = False
+
+        # The keys of the export, in order, split around the flows
+        export_detail = get_export_detail(flows=[])
+        export_detail['fields'] = fields or []
+        keys = list(export_detail)
+        flows_position = keys.index('flows')
+        self.head = {key: export_detail[key] for key in keys[:flows_position]}
+        self.tail = {key: export_detail[key] for key in keys[flows_position + 1:]}
+
+        self.fp.write('{')
+        for key, value in self.head.items():
+            self.fp.write(self._get_item(key, value) + self.serializer.item_separator)
+        self.fp.write(f'"flows"{self.serializer.key_separator}[')
+
+    def _get_item(self, key, value):
+        return f'{self.serializer.dumps(key)}{self.serializer.key_separator}{self.serializer.dumps(value)}'
+
+    def add_flow(self, flow):
+        """
+        :param flow: Container of the flow, or the flow as already rendered
+        """
+        if self.flow_count:
+            self.fp.write(self.serializer.item_separator)
+        if isinstance(flow, dict):
+            self.fp.write(self.serializer.dumps(flow))
+        else:
+            write_flow(flow, self.fp, self.serializer)
+        self.flow_count += 1
+
+    def add_group(self, group):
+        """
+        :param group: The rendered group, a dict with a name and uuid
+        """
+        self.groups.append(group)
+
+    def close(self):
+        if self.closed:
+            return
+        self.fp.write(']')
+        self.tail['groups'] = self.groups
+        for key, value in self.tail.items():
+            self.fp.write(self.serializer.item_separator + self._get_item(key, value))
+        self.fp.write('}')
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # An export that failed half way is left unfinished, so that it isn't mistaken for a valid one
+        if exc_type is None:
+            self.close()
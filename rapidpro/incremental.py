@@ -0,0 +1,241 @@
+import hashlib
+import json
+from collections import defaultdict
+from pathlib import Path
+
+from rapidpro.parser import Parser
+from rapidpro.utils import iter_dict_from_csv
+
+STATE_VERSION = 1
+
+
+class CompileState:
+    """
+    The UUIDs assigned in a compilation of a sheet, keyed by the names of the
+    nodes and groups they belong to.
+
+    Each node is stored with a fingerprint of its rows (including their from
+    and condition cells), so that a later compilation can tell which nodes
+    are untouched and give them the same UUIDs again.
+
+    The state returned by IncrementalParser.get_state also holds on to the
+    nodes and groups themselves, so that a later compilation in the same
+    process can reuse the untouched nodes rather than build them again.
+    These are not part of the saved state.
+    """
+
+    def __init__(self, flow_uuid=None, nodes=None, groups=None, node_objects=None, group_objects=None):
+        self.flow_uuid = flow_uuid
+        self.nodes = nodes or {}
+        self.groups = groups or {}
+        self.node_objects = node_objects or {}
+        self.group_objects = group_objects or {}
+
+    def to_dict(self):
+        return {
+            'version': STATE_VERSION,
+            'flow_uuid': self.flow_uuid,
+            'nodes': self.nodes,
+            'groups': self.groups,
+        }
+
+    @classmethod
+    def from_dict(cls, state_dict):
+        if state_dict.get('version') != STATE_VERSION:
+            raise ValueError(f'Unsupported compile state version {state_dict.get("version")}')
+        return cls(state_dict['flow_uuid'], state_dict['nodes'], state_dict['groups'])
+
+    def save(self, path):
+        with open(path, 'w') as state_file:
+            json.dump(self.to_dict(), state_file)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as state_file:
+            return cls.from_dict(json.load(state_file))
+
+
+def get_node_uuids(node):
+    # All UUIDs of a node, in the order in which its objects were created
+    uuids = {
+        'uuid': node.uuid,
+        'actions': [action.uuid for action in node.actions],
+        'exit': node.default_exit.uuid if node.default_exit else None,
+        'categories': [],
+        'cases': [],
+    }
+    if node.router is not None:
+        uuids['categories'] = [[category.uuid, category.exit_uuid] for category in node.router.categories]
+        uuids['cases'] = [case.uuid for case in node.router.cases]
+    return uuids
+
+
+def set_node_uuids(node, uuids):
+    # The inverse of get_node_uuids. The node must have been created from the same rows.
+    node.uuid = uuids['uuid']
+    node.invalidate()
+    for action, action_uuid in zip(node.actions, uuids['actions']):
+        action.uuid = action_uuid
+        action.invalidate()
+    if node.default_exit and uuids['exit']:
+        node.default_exit.uuid = uuids['exit']
+
+    if node.router is not None:
+        for category, (category_uuid, exit_uuid) in zip(node.router.categories, uuids['categories']):
+            if category is node.router.default_category:
+                node.router.default_category_uuid = category_uuid
+            for case in node.router.cases:
+                if case.category_uuid == category.uuid:
+                    case.category_uuid = category_uuid
+            category.uuid = category_uuid
+            category.exit_uuid = exit_uuid
+        for case, case_uuid in zip(node.router.cases, uuids['cases']):
+            case.uuid = case_uuid
+            case.invalidate()
+        node.router.case_key_to_case_map = {}
+        for case in node.router.cases:
+            case_key = node.router._get_case_key(case.type, case.arguments, case.category_uuid)
+            node.router.case_key_to_case_map.setdefault(case_key, case)
+
+
+class IncrementalParser(Parser):
+    """
+    Parser that reuses the nodes of a previous compilation of the same sheet.
+
+    Nodes whose rows are unchanged since the previous compilation are taken
+    over as they are if the previous compilation happened in this process,
+    and are rebuilt with all of their previous UUIDs if the state was loaded
+    from disk. Either way, re-importing the export only touches the nodes
+    that were edited. Nodes with new or changed rows are built from scratch
+    and get new UUIDs. Groups and the flow itself keep their UUIDs as long
+    as their names are unchanged.
+
+    All rows are read before the first node is yielded, as the nodes can
+    only be compared once all of their rows are known.
+    """
+
+    def __init__(self, container, sheet_rows, flow_name=None, keep_rows=True, state=None):
+        """
+        :param state: CompileState of the previous compilation, or None to compile from scratch
+        """
+        super().__init__(container, sheet_rows, flow_name=flow_name, keep_rows=keep_rows)
+        self.previous_state = state or CompileState()
+        self.node_fingerprints = {}
+        self.reused_node_names = []
+        self.rebuilt_node_names = []
+        self.unlinked_rows = []
+
+    def iter_parse(self):
+        rows = list(self.sheet_rows)
+        fingerprints = defaultdict(hashlib.sha1)
+        for row in rows:
+            fingerprints[self.get_node_name(row)].update(json.dumps(list(row.items())).encode('utf-8'))
+        self.node_fingerprints = {node_name: fingerprint.hexdigest() for node_name, fingerprint in fingerprints.items()}
+
+        for row in rows:
+            if self.get_node_name(row) in self.previous_state.node_objects and self.is_unchanged(row):
+                new_node = self.reuse_row(row)
+            else:
+                new_node = self.add_row(row)
+            if new_node:
+                yield new_node
+
+        self.link_nodes()
+
+    def is_unchanged(self, row):
+        node_name = self.get_node_name(row)
+        previous_node = self.previous_state.nodes.get(node_name)
+        return previous_node is not None and previous_node['fingerprint'] == self.node_fingerprints[node_name]
+
+    def reuse_row(self, row):
+        # The counterpart of add_row for the rows of unchanged nodes, which takes over the node of
+        # the previous compilation. Returns the node for the first row of the node, None otherwise.
+        if self.keep_rows:
+            self.sheet_map[row['row_id']] = row
+            self.edge_index.add_row(row)
+
+        if row['type'] in ['add_to_group', 'remove_from_group']:
+            # Register the group of the reused action
+            self._get_or_create_group(row)
+
+        node_name = self.get_node_name(row)
+        node = self.previous_state.node_objects[node_name]
+        self.row_id_to_node_map[row['row_id']] = node
+        self.link_row(row['row_id'], row['from'])
+        if node_name in self.node_name_to_node_map:
+            return None
+
+        # The rows linking from the node may have changed, so it is linked again from scratch
+        if node.default_exit:
+            node.update_default_exit(None)
+        self.container.add_node(node)
+        self.node_name_to_node_map[node_name] = node
+        return node
+
+    def _get_or_create_group(self, row):
+        group_name = self.get_object_name(row)
+        if group_name not in self.group_name_to_group_map and group_name in self.previous_state.group_objects:
+            self.group_name_to_group_map[group_name] = self.previous_state.group_objects[group_name]
+        return super()._get_or_create_group(row)
+
+    def link_row(self, row_id, row_from):
+        # The rows are linked once their UUIDs have been restored, see link_nodes
+        self.unlinked_rows.append((row_id, row_from))
+
+    def link_nodes(self):
+        # The UUIDs are restored before linking, so that the exits point at the restored node UUIDs
+        self.restore_uuids()
+        for row_id, row_from in self.unlinked_rows:
+            with self.uuid_scope.row(row_id):
+                super().link_row(row_id, row_from)
+        super().link_nodes()
+
+    def restore_uuids(self):
+        if self.previous_state.flow_uuid:
+            self.container.uuid = self.previous_state.flow_uuid
+
+        for group_name, group in self.group_name_to_group_map.items():
+            if group_name in self.previous_state.groups:
+                group.uuid = self.previous_state.groups[group_name]
+                group.invalidate()
+
+        for node_name, node in self.node_name_to_node_map.items():
+            previous_node = self.previous_state.nodes.get(node_name)
+            if node is self.previous_state.node_objects.get(node_name):
+                self.reused_node_names.append(node_name)
+            elif previous_node and previous_node['fingerprint'] == self.node_fingerprints[node_name]:
+                set_node_uuids(node, previous_node['uuids'])
+                self.reused_node_names.append(node_name)
+            else:
+                self.rebuilt_node_names.append(node_name)
+
+    def get_state(self):
+        return CompileState(
+            flow_uuid=self.container.uuid,
+            nodes={
+                node_name: {
+                    'fingerprint': self.node_fingerprints[node_name],
+                    'uuids': get_node_uuids(node),
+                }
+                for node_name, node in self.node_name_to_node_map.items()
+            },
+            groups={group_name: group.uuid for group_name, group in self.group_name_to_group_map.items()},
+            node_objects=dict(self.node_name_to_node_map),
+            group_objects=dict(self.group_name_to_group_map),
+        )
+
+
+def recompile_flow(csv_file_path, state=None, flow_name=None):
+    """
+    Compile a csv sheet, reusing the UUIDs of the nodes that are unchanged since the previous compilation.
+
+    :param csv_file_path: Path of the csv file
+    :param state: CompileState returned by the previous compilation, or None
+    :param flow_name: Name of the flow, the name of the csv file if None
+    :return: The rendered flow and the CompileState to pass to the next compilation
+    """
+    flow_name = flow_name or Path(csv_file_path).stem
+    parser = IncrementalParser(None, sheet_rows=iter_dict_from_csv(csv_file_path), flow_name=flow_name,
+                               keep_rows=False, state=state)
+    parser.parse()
+    return parser.container.render(), parser.get_state()
@@ -1,3 +1,4 @@
+from rapidpro.models.common import Renderable
 from rapidpro.utils import generate_new_uuid
 
 
@@ -11,12 +12,20 @@ from rapidpro.utils import generate_new_uuid
 # - No action, split by random
 
 
-class Action:
+class Action(Renderable):
+    __slots__ = ('uuid', 'type')
+
     def __init__(self, type):
-        self.uuid = generate_new_uuid()
+        self.uuid = generate_new_uuid('action')
         self.type = type
 
-    def render(self):
+    def clone(self):
+        # A copy of the action with a new UUID
+        action = self._copy()
+        action.uuid = generate_new_uuid('action')
+        return action
+
+    def _render(self):
         return {
             'uuid': self.uuid,
             'type': self.type,
@@ -24,6 +33,8 @@ class Action:
 
 
 class SendMessageAction(Action):
+    __slots__ = ('text', 'attachments', 'quick_replies', 'all_urns')
+
     # TODO: Don't use mutable default values (bad things will happen)
     def __init__(self, text, attachments=None, quick_replies=None, all_urns=None):
         super().__init__('send_msg')
@@ -34,18 +45,27 @@ class SendMessageAction(Action):
 
     def add_attachment(self, attachment):
         self.attachments.append(attachment)
+        self.invalidate()
 
     def add_quick_reply(self, quick_reply):
         self.quick_replies.append(quick_reply)
+        self.invalidate()
 
-    def render(self):
+    def clone(self):
+        action = super().clone()
+        action.attachments = list(self.attachments)
+        action.quick_replies = list(self.quick_replies)
+        return action
+
+    def _render(self):
         # Can we find a more compact way of invoking the superclass
         # to render the common fields?
-        render_dict = super().render()
+        render_dict = super()._render()
         render_dict.update({
             "text": self.text,
-            "attachments": self.attachments,
-            "quick_replies": self.quick_replies,
+            # Copies, as the rendered dict may be kept and shared
+            "attachments": list(self.attachments),
+            "quick_replies": list(self.quick_replies),
         })
 
         if self.all_urns:
@@ -57,6 +77,8 @@ class SendMessageAction(Action):
 
 
 class SetContactFieldAction(Action):
+    __slots__ = ('field_key', 'field_name', 'value')
+
     def __init__(self, field_name, value):
         super().__init__('set_contact_field')
         self.field_key = self._get_field_key(field_name)
@@ -66,7 +88,7 @@ class SetContactFieldAction(Action):
     def _get_field_key(self, field_name):
         return field_name.strip().replace(' ', '_')
 
-    def render(self):
+    def _render(self):
         return {
             "uuid": self.uuid,
             "type": self.type,
@@ -78,12 +100,27 @@ class SetContactFieldAction(Action):
         }
 
 
-class Group:
+class Group(Renderable):
+    # Groups are shared between actions, so a group can have several owners
+    __slots__ = ('name', 'uuid', '_owners')
+
     def __init__(self, name):
         self.name = name
-        self.uuid = generate_new_uuid()
+        self.uuid = generate_new_uuid('group')
+
+    def _add_owner(self, owner):
+        if not hasattr(self, '_owners'):
+            self._owners = set()
+        self._owners.add(owner)
+
+    def _remove_owner(self, owner):
+        if hasattr(self, '_owners'):
+            self._owners.discard(owner)
+
+    def _get_owners(self):
+        return getattr(self, '_owners', ())
 
-    def render(self):
+    def _render(self):
         return {
             'name': self.name,
             'uuid': self.uuid
@@ -91,22 +128,42 @@ class Group:
 
 
 class GenericGroupAction(Action):
+    __slots__ = ('groups',)
+
     def __init__(self, type, groups):
         super().__init__(type)
+        self.set_groups(groups)
+
+    def set_groups(self, groups):
+        # The action stops being an owner of its previous groups, which may
+        # outlive it (e.g. the groups of a template, see RowTemplateCache)
+        for group in getattr(self, 'groups', ()):
+            group._remove_owner(self)
         self.groups = groups
+        for group in groups:
+            group._add_owner(self)
+        self.invalidate()
+
+    def clone(self):
+        action = super().clone()
+        action.set_groups(list(self.groups))
+        return action
 
-    def render(self):
+    def _render(self):
         return NotImplementedError
 
 
 class AddContactGroupAction(GenericGroupAction):
+    __slots__ = ()
+
     def __init__(self, groups):
         super().__init__('add_contact_groups', groups)
 
     def add_group(self, group):
         self.groups.append(group)
+        self._adopt(group)
 
-    def render(self):
+    def _render(self):
         return {
             "type": self.type,
             "uuid": self.uuid,
@@ -115,11 +172,13 @@ class AddContactGroupAction(GenericGroupAction):
 
 
 class RemoveContactGroupAction(GenericGroupAction):
+    __slots__ = ('all_groups',)
+
     def __init__(self, groups, all_groups=None):
         super().__init__('remove_contact_groups', groups)
         self.all_groups = all_groups
 
-    def render(self):
+    def _render(self):
         render_dict = {
             "type": self.type,
             "uuid": self.uuid,
@@ -133,13 +192,15 @@ class RemoveContactGroupAction(GenericGroupAction):
 
 
 class SetRunResultAction(Action):
+    __slots__ = ('name', 'value', 'category')
+
     def __init__(self, name, value, category):
         super().__init__('set_run_result')
         self.name = name
         self.value = value
         self.category = category
 
-    def render(self):
+    def _render(self):
         return {
             "type": self.type,
             "name": self.name,
@@ -150,16 +211,26 @@ class SetRunResultAction(Action):
 
 
 class EnterFlowAction(Action):
+    __slots__ = ('flow',)
+
     def __init__(self, flow_name):
         super().__init__('enter_flow')
         self.flow = {
             'name': flow_name,
-            'uuid': generate_new_uuid()
+            'uuid': generate_new_uuid('flow')
+        }
+
+    def clone(self):
+        action = super().clone()
+        action.flow = {
+            'name': self.flow['name'],
+            'uuid': generate_new_uuid('flow')
         }
+        return action
 
-    def render(self):
+    def _render(self):
         return {
             "type": self.type,
             "uuid": self.uuid,
-            "flow": self.flow
+            "flow": dict(self.flow)
         }
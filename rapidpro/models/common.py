@@ -1,13 +1,131 @@
-from rapidpro.utils import generate_new_uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
 
+from rapidpro.utils import allocate_uuid, reserve_uuid
+
+# Whether render stores its output, see caching_renders
+render_caching_enabled = ContextVar('render_caching_enabled', default=False)
+
+
+@contextmanager
+def caching_renders(enabled=True):
+    # Renders in this context are kept by the objects and reused by later calls to render
+    token = render_caching_enabled.set(enabled)
+    try:
+        yield
+    finally:
+        render_caching_enabled.reset(token)
+
+
+class Renderable:
+    """
+    Base class of the models, which can cache the output of render.
+
+    Caching is off unless renders happen within caching_renders, as the cached
+    renders take up as much memory as the rendered flow. Renders that are
+    already cached are reused either way.
+
+    Every object knows the object it is part of (its owner), e.g. the node
+    of an action. The methods of the models that change an object, or add
+    an object to it, clear its cached render and those of its owners, up to
+    the container. After setting an attribute directly, call invalidate.
+    The rendered dicts are shared between calls to render, so they must
+    not be changed.
+    """
+    __slots__ = ('_rendered', '_owner')
+
+    def __new__(cls, *args, **kwargs):
+        obj = super().__new__(cls)
+        obj._rendered = None
+        obj._owner = None
+        return obj
+
+    def __getstate__(self):
+        # Copies start out without an owner or a cached render
+        return {name: getattr(self, name) for name in get_copied_slot_names(type(self)) if hasattr(self, name)}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def _copy(self):
+        # A shallow copy, like copy.copy but faster
+        obj = type(self).__new__(type(self))
+        for name in get_copied_slot_names(type(self)):
+            setattr(obj, name, getattr(self, name))
+        return obj
+
+    def _add_owner(self, owner):
+        self._owner = owner
+
+    def _get_owners(self):
+        return (self._owner,) if self._owner is not None else ()
+
+    def _adopt(self, child):
+        # Call after adding an object to this object
+        child._add_owner(self)
+        self.invalidate()
+
+    def invalidate(self):
+        # The owners of an object without a cached render have none either, so they are left alone
+        if self._rendered is None:
+            return
+        self._rendered = None
+        for owner in self._get_owners():
+            owner.invalidate()
+
+    def _render(self):
+        raise NotImplementedError
+
+    def render(self):
+        rendered = self._rendered
+        if rendered is None:
+            rendered = self._render()
+            if render_caching_enabled.get():
+                self._rendered = rendered
+        return rendered
+
+
+UNCOPIED_SLOTS = {'_rendered', '_owner', '_owners'}
+
+
+@lru_cache(maxsize=None)
+def get_copied_slot_names(cls):
+    slot_names = []
+    for base in reversed(cls.__mro__):
+        slots = getattr(base, '__slots__', ())
+        slot_names.extend([slots] if isinstance(slots, str) else slots)
+    return [name for name in slot_names if name not in UNCOPIED_SLOTS]
+
+
+class Exit(Renderable):
+    __slots__ = ('_uuid', '_uuid_reservation', 'destination_uuid')
 
-class Exit:
     def __init__(self, destination_uuid=None, exit_uuid=None):
-        self.uuid = exit_uuid if exit_uuid else generate_new_uuid()
+        # The UUID is reserved now and allocated when it is first needed, usually when the exit
+        # is rendered, so that no UUIDs are allocated for exits that are replaced or dropped
+        self._uuid = exit_uuid
+        self._uuid_reservation = reserve_uuid('exit') if exit_uuid is None else None
         self.destination_uuid = destination_uuid
 
+    @property
+    def uuid(self):
+        if self._uuid is None:
+            self._uuid = allocate_uuid(self._uuid_reservation)
+            self._uuid_reservation = None
+        return self._uuid
 
-    def render(self):
+    @uuid.setter
+    def uuid(self, uuid):
+        self._uuid = uuid
+        self._uuid_reservation = None
+        self.invalidate()
+
+    def clone(self):
+        return Exit(destination_uuid=self.destination_uuid)
+
+    def _render(self):
         return {
             'destination_uuid': self.destination_uuid,
             'uuid': self.uuid,
@@ -1,9 +1,12 @@
+from rapidpro.models.common import Renderable
 from rapidpro.utils import generate_new_uuid
 
 
-class Container:
+class Container(Renderable):
+    __slots__ = ('uuid', 'name', 'language', 'type', 'nodes')
+
     def __init__(self, flow_name, type='messaging', language='eng'):
-        self.uuid = generate_new_uuid()
+        self.uuid = generate_new_uuid('flow')
         self.name = flow_name
         self.language = language
         self.type = type
@@ -11,12 +14,18 @@ class Container:
 
     def add_node(self, node):
         self.nodes.append(node)
+        self._adopt(node)
 
-    def render(self):
+    def render_header(self):
+        # Everything but the nodes, see rapidpro.export for rendering the nodes one at a time
         return {
             "uuid": self.uuid,
             "name": self.name,
             "language": self.language,
             "type": self.type,
-            "nodes": [node.render() for node in self.nodes]
         }
+
+    def _render(self):
+        render_dict = self.render_header()
+        render_dict["nodes"] = [node.render() for node in self.nodes]
+        return render_dict
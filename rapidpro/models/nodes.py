@@ -1,5 +1,5 @@
 from rapidpro.models.actions import EnterFlowAction
-from rapidpro.models.common import Exit
+from rapidpro.models.common import Exit, Renderable
 
 from rapidpro.models.routers import SwitchRouter, RandomRouter
 from rapidpro.utils import generate_new_uuid
@@ -27,9 +27,11 @@ from rapidpro.utils import generate_new_uuid
 #   wait_for_response is a potential instance of that
 
 
-class BaseNode:
+class BaseNode(Renderable):
+    __slots__ = ('uuid', 'actions', 'router', 'has_basic_exit', 'default_exit', 'exits')
+
     def __init__(self):
-        self.uuid = generate_new_uuid()
+        self.uuid = generate_new_uuid('node')
         self.actions = []
         self.router = None
 
@@ -43,13 +45,25 @@ class BaseNode:
 
     def update_default_exit(self, destination_uuid):
         # TODO: Think of any caveats to storing a node rather than a UUID
-        self.default_exit = Exit(destination_uuid=destination_uuid)
+        # An existing exit is retargeted, so that it keeps its UUID
+        if self.default_exit:
+            self.default_exit.destination_uuid = destination_uuid
+            self.default_exit.invalidate()
+        else:
+            self.default_exit = Exit(destination_uuid=destination_uuid)
+            self._adopt(self.default_exit)
+
+    def set_router(self, router):
+        self.router = router
+        self._adopt(router)
 
     def _add_exit(self, exit):
         self.exits.append(exit)
+        self._adopt(exit)
 
     def add_action(self, action):
         self.actions.append(action)
+        self._adopt(action)
 
     def add_choice(self):
         raise NotImplementedError
@@ -57,13 +71,31 @@ class BaseNode:
     def validate(self):
         raise NotImplementedError
 
+    def clone(self):
+        # A copy of the node in which every object has a new UUID
+        node = self._copy()
+        node.uuid = generate_new_uuid('node')
+        node.actions = []
+        node.exits = []
+        node.default_exit = None
+        for action in self.actions:
+            node.add_action(action.clone())
+        if self.default_exit:
+            node.default_exit = self.default_exit.clone()
+            node._adopt(node.default_exit)
+        for exit in self.exits:
+            node._add_exit(exit.clone())
+        if self.router is not None:
+            node.set_router(self.router.clone())
+        return node
+
     def get_last_action(self):
         try:
             return self.actions[-1]
         except IndexError:
             return None
 
-    def render(self):
+    def _render(self):
         raise NotImplementedError
         # recursively render the elements of the node
         fields = {
@@ -80,6 +112,7 @@ class BaseNode:
 
 class BasicNode(BaseNode):
     # A basic node can accomodate actions and a very basic exit
+    __slots__ = ()
 
     def _add_exit(self, exit):
         raise NotImplementedError
@@ -91,7 +124,7 @@ class BasicNode(BaseNode):
         if not self.default_exit:
             raise ValueError('default_exit must be set for BasicNode')
 
-    def render(self):
+    def _render(self):
         self.validate()
         return {
             "uuid": self.uuid,
@@ -101,10 +134,11 @@ class BasicNode(BaseNode):
 
 
 class SwitchRouterNode(BaseNode):
+    __slots__ = ()
 
     def __init__(self, operand, result_name=None, wait_for_message=False):
         super().__init__()
-        self.router = SwitchRouter(operand, result_name, wait_for_message)
+        self.set_router(SwitchRouter(operand, result_name, wait_for_message))
         self.has_basic_exit = False
 
     def add_choice(self, **kwargs):
@@ -116,7 +150,7 @@ class SwitchRouterNode(BaseNode):
 
         self.router.validate()
 
-    def render(self):
+    def _render(self):
         return {
             "uuid": self.uuid,
             "router": self.router.render(),
@@ -125,10 +159,11 @@ class SwitchRouterNode(BaseNode):
 
 
 class RandomRouterNode(BaseNode):
+    __slots__ = ()
 
     def __init__(self, operand, result_name=None, wait_for_message=False):
         super().__init__()
-        self.router = RandomRouter(operand, result_name, wait_for_message)
+        self.set_router(RandomRouter(operand, result_name, wait_for_message))
         self.has_basic_exit = False
 
     def add_choice(self, **kwargs):
@@ -140,7 +175,7 @@ class RandomRouterNode(BaseNode):
 
         self.router.validate()
 
-    def render(self):
+    def _render(self):
         return {
             "uuid": self.uuid,
             "router": self.router.render(),
@@ -149,12 +184,14 @@ class RandomRouterNode(BaseNode):
 
 
 class EnterFlowNode(BaseNode):
+    __slots__ = ()
+
     def __init__(self, flow_name, complete_destination_uuid, expired_destination_uuid):
         super().__init__()
 
         self.add_action(EnterFlowAction(flow_name))
 
-        self.router = SwitchRouter(operand='@child.run.status', result_name=None, wait_for_message=False)
+        self.set_router(SwitchRouter(operand='@child.run.status', result_name=None, wait_for_message=False))
 
         self.add_choice(comparison_variable='@child.run.status', comparison_type='has_only_text',
                         comparison_arguments='completed', category_name='Complete',
@@ -169,7 +206,7 @@ class EnterFlowNode(BaseNode):
     def validate(self):
         pass
 
-    def render(self):
+    def _render(self):
         return {
             "uuid": self.uuid,
             "actions": [action.render() for action in self.actions],
@@ -2,13 +2,16 @@ import logging
 import string
 from random import random
 
-from rapidpro.models.common import Exit
-from rapidpro.utils import generate_new_uuid
+from rapidpro.models.common import Exit, Renderable
+from rapidpro.utils import allocate_uuid, generate_new_uuid, reserve_uuid
 
 logger = logging.getLogger(__name__)
 
 
-class BaseRouter:
+class BaseRouter(Renderable):
+    __slots__ = ('type', 'categories', 'default_category_uuid', 'cases', 'result_name', 'name_to_category_map',
+                 'case_key_to_case_map', 'default_category')
+
     def __init__(self, result_name=None):
         self.type = None
         self.categories = []
@@ -16,40 +19,51 @@ class BaseRouter:
         self.cases = []
         self.result_name = result_name
 
+        # Indexes into categories and cases, maintained by _add_category and _add_case
+        self.name_to_category_map = {}
+        self.case_key_to_case_map = {}
+        self.default_category = None
+
     def set_result_name(self, result_name):
         self.result_name = result_name
+        self.invalidate()
 
     def _get_category_or_none(self, category_name):
-        result = [c for c in self.categories if c.name == category_name]
-        if result:
-            return result[0]
+        return self.name_to_category_map.get(category_name)
 
     def _has_default_category(self):
-        result = [c for c in self.categories if c.is_default]
-        return bool(result)
+        return self.default_category is not None
 
     def _add_category(self, category_name, destination_uuid, is_default):
         if self._has_default_category() and is_default:
-            logger.warning(f'Overwriting default category for Router {self.uuid}')
+            logger.warning(f'Overwriting default category {self.default_category.name} -> {category_name}')
 
         category = RouterCategory(category_name, destination_uuid, is_default)
 
         if is_default:
             self.default_category_uuid = category.uuid
+            self.default_category = category
 
         self.categories.append(category)
+        self._adopt(category)
+        self.name_to_category_map.setdefault(category_name, category)
         return self.categories[-1]
 
+    @staticmethod
+    def _get_case_key(comparison_type, arguments, category_uuid):
+        # Arguments are usually given as a list, which can't be used in a dict key
+        if isinstance(arguments, list):
+            arguments = tuple(arguments)
+        return comparison_type, arguments, category_uuid
+
     def _get_case_or_none(self, comparison_type, arguments, category_uuid):
-        for case in self.cases:
-            if case.type == comparison_type \
-                    and case.arguments == arguments \
-                    and case.category_uuid == category_uuid:
-                return case
+        return self.case_key_to_case_map.get(self._get_case_key(comparison_type, arguments, category_uuid))
 
     def _add_case(self, comparison_type, arguments, category_uuid):
         case = RouterCase(comparison_type, arguments, category_uuid)
         self.cases.append(case)
+        self._adopt(case)
+        self.case_key_to_case_map.setdefault(self._get_case_key(comparison_type, arguments, category_uuid), case)
         return self.cases[-1]
 
     def get_or_create_case(self, comparison_type, arguments, category_name):
@@ -74,11 +88,41 @@ class BaseRouter:
     def get_exits(self):
         return [c.get_exit() for c in self.categories]
 
-    def render(self):
+    def clone(self):
+        # A copy of the router in which every category and case has a new UUID
+        router = self._copy()
+        router.categories = []
+        router.cases = []
+        router.name_to_category_map = {}
+        router.case_key_to_case_map = {}
+        router.default_category_uuid = None
+        router.default_category = None
+
+        category_uuids = {}
+        for category in self.categories:
+            new_category = category.clone()
+            category_uuids[category.uuid] = new_category.uuid
+            router.categories.append(new_category)
+            router._adopt(new_category)
+            router.name_to_category_map.setdefault(new_category.name, new_category)
+            if category is self.default_category:
+                router.default_category_uuid = new_category.uuid
+                router.default_category = new_category
+
+        for case in self.cases:
+            new_case = case.clone(category_uuids.get(case.category_uuid, case.category_uuid))
+            router.cases.append(new_case)
+            router._adopt(new_case)
+            router.case_key_to_case_map.setdefault(
+                self._get_case_key(new_case.type, new_case.arguments, new_case.category_uuid), new_case)
+        return router
+
+    def _render(self):
         raise NotImplementedError
 
 
 class SwitchRouter(BaseRouter):
+    __slots__ = ('operand', 'wait_for_message')
 
     def __init__(self, operand, result_name, wait_for_message):
         super().__init__(result_name)
@@ -101,13 +145,15 @@ class SwitchRouter(BaseRouter):
         if self.operand and operand and self.operand != operand:
             logger.warning(f'Overwriting operand from {self.operand} -> {operand}')
 
-        self.operand = operand
+        if operand != self.operand:
+            self.operand = operand
+            self.invalidate()
 
     def validate(self):
         # TODO: Add validation
         pass
 
-    def render(self):
+    def _render(self):
         self.validate()
         render_dict = {
             "type": self.type,
@@ -126,6 +172,8 @@ class SwitchRouter(BaseRouter):
 
 
 class RandomRouter(BaseRouter):
+    __slots__ = ()
+
     # Wait for message and operand are not required in RandomRouter
     def __init__(self, result_name=None):
         super().__init__(result_name)
@@ -134,30 +182,61 @@ class RandomRouter(BaseRouter):
     def add_choice(self, category_name, destination_uuid, is_default=False):
         self.get_or_create_category(category_name, destination_uuid, is_default)
 
-    def render(self):
+    def _render(self):
         return {
             "type": self.type,
             "categories": [category.render() for category in self.categories]
         }
 
 
-class RouterCategory:
+class RouterCategory(Renderable):
+    __slots__ = ('uuid', 'name', '_exit_uuid', '_exit_uuid_reservation', 'destination_uuid', 'is_default', '_exit')
+
     def __init__(self, name, destination_uuid, is_default=False):
         """
         :param name: Name of the category
         :param destination_uuid: The UUID of the node that this category should point to
         :param is_default: is this the default category?
         """
-        self.uuid = generate_new_uuid()
+        self.uuid = generate_new_uuid('category')
         self.name = name
-        self.exit_uuid = generate_new_uuid()
+        # Allocated when it is first needed, see Exit
+        self._exit_uuid = None
+        self._exit_uuid_reservation = reserve_uuid('exit')
         self.destination_uuid = destination_uuid
         self.is_default = is_default
+        self._exit = None
 
-    def get_exit(self):
-        return Exit(exit_uuid=self.exit_uuid, destination_uuid=self.destination_uuid)
+    @property
+    def exit_uuid(self):
+        if self._exit_uuid is None:
+            self._exit_uuid = allocate_uuid(self._exit_uuid_reservation)
+            self._exit_uuid_reservation = None
+        return self._exit_uuid
+
+    @exit_uuid.setter
+    def exit_uuid(self, exit_uuid):
+        self._exit_uuid = exit_uuid
+        self._exit_uuid_reservation = None
+        self.invalidate()
 
-    def render(self):
+    def get_exit(self):
+        # The same exit is returned every time, updated to match the category
+        if self._exit is None:
+            self._exit = Exit(exit_uuid=self.exit_uuid, destination_uuid=self.destination_uuid)
+            self._exit._add_owner(self)
+        else:
+            if self._exit.uuid != self.exit_uuid:
+                self._exit.uuid = self.exit_uuid
+            if self._exit.destination_uuid != self.destination_uuid:
+                self._exit.destination_uuid = self.destination_uuid
+                self._exit.invalidate()
+        return self._exit
+
+    def clone(self):
+        return RouterCategory(self.name, self.destination_uuid, self.is_default)
+
+    def _render(self):
         return {
             'uuid': self.uuid,
             'name': self.name,
@@ -172,17 +251,23 @@ def categoryNameFromComparisonArguments(comparison_arguments):
            ''.join(random.choice(string.ascii_letters) for _ in range(10))
 
 
-class RouterCase:
+class RouterCase(Renderable):
+    __slots__ = ('uuid', 'type', 'arguments', 'category_uuid')
+
     def __init__(self, comparison_type, arguments, category_uuid):
-        self.uuid = generate_new_uuid()
+        self.uuid = generate_new_uuid('case')
         self.type = comparison_type
         self.arguments = arguments
         self.category_uuid = category_uuid
 
-    def render(self):
+    def clone(self, category_uuid):
+        return RouterCase(self.type, self.arguments, category_uuid)
+
+    def _render(self):
         return {
             'uuid': self.uuid,
             'type': self.type,
             'category_uuid': self.category_uuid,
-            'arguments': self.arguments,
+            # A copy, as the rendered dict may be kept and shared
+            'arguments': list(self.arguments) if isinstance(self.arguments, list) else self.arguments,
         }
@@ -1,11 +1,12 @@
-import re
 from collections import defaultdict
+from operator import itemgetter
 
 from rapidpro.models.actions import SendMessageAction, SetContactFieldAction, AddContactGroupAction, \
-    RemoveContactGroupAction, SetRunResultAction, Group
+    RemoveContactGroupAction, SetRunResultAction, Group, GenericGroupAction
 from rapidpro.models.containers import Container
 from rapidpro.models.nodes import BaseNode, BasicNode, SwitchRouterNode
-from rapidpro.utils import get_object_from_cell_value, get_separators
+from rapidpro.sheets import HeaderIndex, EdgeIndex
+from rapidpro.utils import get_object_from_cell_value, split_cell_value, UuidScope, current_uuid_strategy
 
 
 class Dispatcher:
@@ -27,32 +28,124 @@ class Dispatcher:
 
 class Parser:
 
-    def __init__(self, container, sheet_rows, flow_name=None):
-        self.container = container or Container(flow_name=flow_name)
+    def __init__(self, container, sheet_rows, flow_name=None, keep_rows=True, template_cache=None):
+        """
+        :param container: Container to add the nodes to, a new one is created if None
+        :param sheet_rows: Iterable of row dicts. This may be a lazy iterator
+            (see iter_dict_from_csv), in which case rows are only read while parsing.
+        :param flow_name: Name of the flow, used if no container is given
+        :param keep_rows: Store every parsed row in sheet_map. Set this to False
+            when streaming large sheets to avoid holding all rows in memory.
+        :param template_cache: RowTemplateCache of the actions and nodes built from
+            rows, which may be shared between the parsers of several sheets.
+            If None, every row is built from scratch.
+        """
+        # The scope of the UUIDs of the flow, see DeterministicUuidStrategy. Each
+        # compilation starts from a reset strategy, so that reusing it gives the same UUIDs.
+        current_uuid_strategy.get().reset()
+        self.uuid_scope = UuidScope(container.name if container else flow_name)
+        with self.uuid_scope:
+            self.container = container or Container(flow_name=flow_name)
         self.sheet_rows = sheet_rows
+        self.keep_rows = keep_rows
 
         self.sheet_map = defaultdict()
-        for row in self.sheet_rows:
-            self.sheet_map[row['row_id']] = row
-
         self.row_id_to_node_map = defaultdict()
         self.node_name_to_node_map = defaultdict()
         self.group_name_to_group_map = defaultdict()
+        self.header_index = None
+        self.template_cache = template_cache
+        self.key_columns = None
+        self.get_key_values = None
+        # The edges between all rows, only kept along with the rows themselves (see keep_rows)
+        self.edge_index = EdgeIndex() if keep_rows else None
+        # The rows linking from rows that haven't been added yet, by the row_id of the missing row
+        self.forward_links = defaultdict(list)
 
     def parse(self):
+        for _ in self.iter_parse():
+            pass
+
+    def iter_parse(self):
+        # Consume the rows one at a time and yield each node as soon as it
+        # has been created. Each row is linked to its parents as soon as they
+        # exist. Rows linking from rows further down in the sheet are linked
+        # once those are added, which updates the exits of yielded nodes.
         for row in self.sheet_rows:
-            self._parse_row(row)
+            new_node = self.add_row(row)
+            if new_node:
+                yield new_node
 
-    def get_row_action(self, row):
-        attachment_types = ['image', 'audio', 'video']
+        self.link_nodes()
+
+    def add_row(self, row):
+        # Create the node and action of a row, and link it to the rows that have been added.
+        # Returns the new node, or None if the row was added to an existing node.
+        if self.keep_rows:
+            self.sheet_map[row['row_id']] = row
+            self.edge_index.add_row(row)
+
+        with self.uuid_scope.row(row['row_id']):
+            new_node = self._parse_row(row)
+            self.link_row(row['row_id'], row['from'])
+        return new_node
+
+    def link_row(self, row_id, row_from):
+        # Point the exits of the parents of a row at its node, and the exit of its
+        # node at the rows that link from it and were added before it. Links
+        # between rows that share a node only determine the order of its actions.
+        node = self.row_id_to_node_map[row_id]
+        for from_row_id in split_cell_value(row_from):
+            if from_row_id == 'start':
+                continue
+
+            from_node = self.row_id_to_node_map.get(from_row_id)
+            if from_node is None:
+                self.forward_links[from_row_id].append(row_id)
+            elif from_node is not node:
+                from_node.update_default_exit(node.uuid)
+
+        for to_row_id in self.forward_links.pop(row_id, ()):
+            to_node = self.row_id_to_node_map[to_row_id]
+            if to_node is not node:
+                node.update_default_exit(to_node.uuid)
+
+    def link_nodes(self):
+        # Called once all rows have been added, when any links that are left are from rows that don't exist
+        for from_row_id, row_ids in self.forward_links.items():
+            raise ValueError(f'Row {row_ids[0]} links from row {from_row_id}, which does not exist')
+
+    def get_row_key(self, row):
+        # The content of a row, without the columns that only identify the row or place it in the flow
+        if self.key_columns is None:
+            excluded_columns = {'row_id', 'from'} | set(self.get_header_index(row).ui_columns)
+            self.key_columns = tuple(column for column in self.get_header_index(row).header
+                                     if column not in excluded_columns)
+            self.get_key_values = itemgetter(*self.key_columns) if self.key_columns else lambda row: ()
+        # The columns are part of the key, as the cache may be shared between sheets with different columns
+        return self.key_columns, self.get_key_values(row)
+
+    def get_row_action(self, row, row_key=None):
+        # row_key is the key of the row in the template cache, if there is one
+        if self.template_cache is None:
+            return self.build_row_action(row)
+
+        row_key = row_key or self.get_row_key(row)
+        action = self.template_cache.get_or_build('action', row_key, lambda: self.build_row_action(row))
+        if isinstance(action, GenericGroupAction):
+            # The template may have been built for another sheet, which has its own groups
+            action.set_groups([self._get_or_create_group(row)])
+        return action
+
+    def build_row_action(self, row):
+        header_index = self.get_header_index(row)
         if row['type'] == 'send_message':
             send_message_action = SendMessageAction(text=row['message_text'])
-            if any([row[attachment_type] for attachment_type in attachment_types]):
-                send_message_action.add_attachment(
-                    [row[attachment_type] for attachment_type in attachment_types if row[attachment_type]][0])
+            attachments = [row[column] for column in header_index.attachment_columns if row[column]]
+            if attachments:
+                send_message_action.add_attachment(attachments[0])
 
-            choice_cells = [row[f'choice:{i}'] for i in range(1, 10)]
-            quick_replies = [qr for qr in choice_cells if qr]
+            quick_replies = [row[column] for column in header_index.choice_columns if row[column]]
             if quick_replies:
                 for qr in quick_replies:
                     send_message_action.add_quick_reply(qr)
@@ -89,7 +182,14 @@ class Parser:
 
         return new_group
 
-    def get_row_node(self, row):
+    def get_row_node(self, row, row_key=None):
+        if self.template_cache is None:
+            return self.build_row_node(row)
+
+        row_key = row_key or self.get_row_key(row)
+        return self.template_cache.get_or_build('node', row_key, lambda: self.build_row_node(row))
+
+    def build_row_node(self, row):
         if row['type'] in ['send_message', 'save_value', 'add_to_group', 'remove_from_group', 'save_flow_result']:
             node = BasicNode()
             node.update_default_exit(None)
@@ -126,7 +226,13 @@ class Parser:
             #        category_destination_uuid, is_default=False)
 
     def get_non_null_condition_keys(self, row):
-        return [key for key in row.keys() if re.search('^condition:(\d+)', key) and row[key]]
+        return [key for key in self.get_header_index(row).condition_columns if row[key]]
+
+    def get_header_index(self, row):
+        # The header index is built from the first row, all rows of a sheet have the same columns
+        if self.header_index is None:
+            self.header_index = HeaderIndex(row.keys())
+        return self.header_index
 
     def get_object_name(self, row):
         return row['obj_id'] or row['obj_name']
@@ -141,19 +247,16 @@ class Parser:
             return None
 
     def _get_from_nodes(self, row_from):
-        seperator_1, _, _ = get_separators(row_from)
-        return [self.row_id_to_node_map[row_id] for row_id in row_from.split(seperator_1)]
+        return [self.row_id_to_node_map[row_id] for row_id in split_cell_value(row_from)]
 
     def _find_destination_node_row_id(self, origin_row_id, condition):
-        for row_id, row in self.sheet_map.items():
-            separator_1, _, _ = get_separators(row['from'])
-            for from_row_id in row['from'].split(separator_1):
-                if from_row_id == origin_row_id and row['condition'] == condition:
-                    return self.row_id_to_node_map()
+        row_ids = self.edge_index.get_children(origin_row_id, condition)
+        if row_ids:
+            return row_ids[0]
 
     def _find_node_with_conditional_exit(self, row_id, condition):
         row = self.sheet_map[row_id]
-        condition_columns = [key for key in row.keys() if key.startswith('condition:')]
+        condition_columns = self.get_header_index(row).condition_columns
         for column_name in condition_columns:
             if row[column_name]:
                 condition_obj = get_object_from_cell_value(row[column_name])
@@ -165,28 +268,22 @@ class Parser:
         return valid_conditions
 
     def _parse_row(self, row):
-        row_action = self.get_row_action(row)
+        row_key = self.get_row_key(row) if self.template_cache is not None else None
+        row_action = self.get_row_action(row, row_key)
         existing_node = self.node_name_to_node_map.get(self.get_node_name(row))
 
         if existing_node:
             existing_node.add_action(row_action)
             self.row_id_to_node_map[row['row_id']] = existing_node
+            return None
         else:
-            new_node = self.get_row_node(row)
+            new_node = self.get_row_node(row, row_key)
 
             if row_action:
                 new_node.add_action(row_action)
 
-            separator_1, _, _ = get_separators(row['from'])
-            from_row_ids = row['from'].split(separator_1)
-
-            for from_id in from_row_ids:
-                if from_id != 'start':
-                    from_nodes = self._get_from_nodes(row['from'])
-                    for node in from_nodes:
-                        node.update_default_exit(new_node.uuid)
-
             self.container.add_node(new_node)
 
             self.row_id_to_node_map[row['row_id']] = new_node
             self.node_name_to_node_map[self.get_node_name(row)] = new_node
+            return new_node
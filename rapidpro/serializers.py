@@ -0,0 +1,77 @@
+import json
+
+# Faster JSON libraries are used if they are installed, see get_serializer
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+class JsonSerializer:
+    # The standard library json module. Its output is the same as json.dumps.
+    name = 'json'
+    item_separator = ', '
+    key_separator = ': '
+
+    def dumps(self, obj):
+        return json.dumps(obj)
+
+
+class OrjsonSerializer:
+    # orjson, which writes compact JSON and doesn't escape non-ASCII characters
+    name = 'orjson'
+    item_separator = ','
+    key_separator = ':'
+
+    def dumps(self, obj):
+        return orjson.dumps(obj).decode('utf-8')
+
+
+class UjsonSerializer:
+    # ujson, which writes compact JSON
+    name = 'ujson'
+    item_separator = ','
+    key_separator = ':'
+
+    def dumps(self, obj):
+        return ujson.dumps(obj, escape_forward_slashes=False)
+
+
+# The serializers by name, fastest first
+SERIALIZERS = {
+    'orjson': OrjsonSerializer,
+    'ujson': UjsonSerializer,
+    'json': JsonSerializer,
+}
+
+INSTALLED_LIBRARIES = {
+    'orjson': orjson,
+    'ujson': ujson,
+    'json': json,
+}
+
+
+def get_available_serializer_names():
+    return [name for name in SERIALIZERS if INSTALLED_LIBRARIES[name] is not None]
+
+
+def get_serializer(name=None):
+    """
+    :param name: Name of the serializer (see SERIALIZERS). If None, the standard
+        library is used. If 'auto', the fastest serializer that is installed is used.
+    """
+    if name is None:
+        name = 'json'
+    elif name == 'auto':
+        name = get_available_serializer_names()[0]
+
+    if name not in SERIALIZERS:
+        raise ValueError(f'Unknown serializer {name}')
+    if INSTALLED_LIBRARIES[name] is None:
+        raise ValueError(f'Serializer {name} is not installed')
+    return SERIALIZERS[name]()
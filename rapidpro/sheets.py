@@ -0,0 +1,183 @@
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from collections.abc import Mapping
+
+from rapidpro.utils import ATTACHMENT_HEADERS, HeaderType, classify_column_header, get_cell_type_for_column_header, \
+    split_cell_value
+
+
+class ColumnarSheet:
+    """
+    Sheet whose cells are stored column by column rather than as one dict per row.
+
+    Every distinct cell value is stored once in a shared string table, and each
+    column only keeps the (row number, string number) pairs of its non-empty
+    cells in two arrays. Rows are accessed through ColumnarRow views, which
+    behave like the dicts produced by csv.DictReader.
+    """
+
+    def __init__(self, header):
+        self.header = list(header)
+        self.column_numbers = {name: i for i, name in enumerate(self.header)}
+
+        # String number 0 is the empty cell
+        self.strings = ['']
+        self.string_numbers = {'': 0}
+
+        self.row_numbers = [array('I') for _ in self.header]
+        self.value_numbers = [array('I') for _ in self.header]
+        self.row_count = 0
+
+    @classmethod
+    def from_rows(cls, rows):
+        rows = iter(rows)
+        first_row = next(rows, None)
+        if first_row is None:
+            return cls([])
+
+        sheet = cls(first_row.keys())
+        sheet.append(first_row)
+        for row in rows:
+            sheet.append(row)
+        return sheet
+
+    def _get_string_number(self, value):
+        string_number = self.string_numbers.get(value)
+        if string_number is None:
+            string_number = len(self.strings)
+            self.strings.append(value)
+            self.string_numbers[value] = string_number
+        return string_number
+
+    def append(self, row):
+        for column_number, column_name in enumerate(self.header):
+            value = row.get(column_name)
+            if value:
+                self.row_numbers[column_number].append(self.row_count)
+                self.value_numbers[column_number].append(self._get_string_number(value))
+        self.row_count += 1
+
+    def get_cell(self, row_number, column_number):
+        row_numbers = self.row_numbers[column_number]
+        index = bisect_left(row_numbers, row_number)
+        if index < len(row_numbers) and row_numbers[index] == row_number:
+            return self.strings[self.value_numbers[column_number][index]]
+        return ''
+
+    def column(self, column_name):
+        # Yield the values of a single column, including the empty cells
+        column_number = self.column_numbers[column_name]
+        values = iter(zip(self.row_numbers[column_number], self.value_numbers[column_number]))
+        next_row_number, string_number = next(values, (None, None))
+
+        for row_number in range(self.row_count):
+            if row_number == next_row_number:
+                yield self.strings[string_number]
+                next_row_number, string_number = next(values, (None, None))
+            else:
+                yield ''
+
+    def __len__(self):
+        return self.row_count
+
+    def __getitem__(self, index):
+        if not -self.row_count <= index < self.row_count:
+            raise IndexError('Row index out of range')
+        return ColumnarRow(self, index % self.row_count)
+
+    def __iter__(self):
+        for row_number in range(self.row_count):
+            yield ColumnarRow(self, row_number)
+
+
+class ColumnarRow(Mapping):
+    # A single row of a ColumnarSheet, behaving like a csv.DictReader row.
+
+    def __init__(self, sheet, row_number):
+        self.sheet = sheet
+        self.row_number = row_number
+
+    def __getitem__(self, key):
+        return self.sheet.get_cell(self.row_number, self.sheet.column_numbers[key])
+
+    def __iter__(self):
+        return iter(self.sheet.header)
+
+    def __len__(self):
+        return len(self.sheet.header)
+
+
+class HeaderIndex:
+    """
+    Classification of the columns of a sheet, built once from its header.
+
+    Numbered columns (condition:N, choice:N) are sorted by their number and
+    attachment columns are in the order image, audio, video. Columns that a
+    sheet doesn't have are left out, so per-row code only has to look at
+    the columns in the relevant list.
+    """
+
+    def __init__(self, header):
+        self.header = list(header)
+
+        numbered_columns = defaultdict(list)
+        self.columns = defaultdict(list)
+        for column_name in self.header:
+            header_type, number = classify_column_header(column_name)
+            if number is None:
+                self.columns[header_type].append(column_name)
+            else:
+                numbered_columns[header_type].append((number, column_name))
+
+        for header_type, columns in numbered_columns.items():
+            self.columns[header_type] = [column_name for _, column_name in sorted(columns)]
+
+        self.condition_columns = self.columns[HeaderType.CONDITION]
+        self.choice_columns = self.columns[HeaderType.CHOICE]
+        self.attachment_columns = [h for h in ATTACHMENT_HEADERS if h in self.columns[HeaderType.ATTACHMENT]]
+        self.object_columns = self.columns[HeaderType.OBJECT]
+        self.ui_columns = self.columns[HeaderType.UI]
+
+        self.cell_types = {column_name: get_cell_type_for_column_header(column_name) for column_name in self.header}
+
+    def get_cell_type(self, column_name):
+        return self.cell_types[column_name]
+
+
+class EdgeIndex:
+    """
+    The edges between the rows of a sheet, as given by their from and condition columns.
+
+    The n-th row_id in the from cell of a row is linked to it with the n-th
+    condition in its condition cell (or '' if there is none). Rows are added
+    one by one, and all lookups are dict lookups.
+    """
+
+    def __init__(self):
+        self.children = defaultdict(list)
+        self.conditional_children = defaultdict(list)
+        self.parents = {}
+
+    def add_row(self, row):
+        row_id = row['row_id']
+        conditions = split_cell_value(row.get('condition') or '')
+
+        parents = []
+        for i, parent_row_id in enumerate(split_cell_value(row['from'])):
+            condition = conditions[i] if i < len(conditions) else ''
+            self.conditional_children[(parent_row_id, condition)].append(row_id)
+            if parent_row_id not in parents:
+                parents.append(parent_row_id)
+                self.children[parent_row_id].append(row_id)
+
+        self.parents[row_id] = parents
+
+    def get_parents(self, row_id):
+        return self.parents.get(row_id, [])
+
+    def get_children(self, parent_row_id, condition=None):
+        # Without a condition, all children of the parent are returned
+        if condition is None:
+            return self.children.get(parent_row_id, [])
+        return self.conditional_children.get((parent_row_id, condition), [])
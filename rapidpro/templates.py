@@ -0,0 +1,59 @@
+import copy
+from collections import OrderedDict
+
+
+class RowTemplateCache:
+    """
+    The actions and nodes built from rows, keyed by the content of the rows.
+
+    Rows that only differ in the columns that place them in a flow (such as
+    row_id and from) produce the same objects, up to their UUIDs. Rather than
+    building these again, a copy of the first one is kept as a template and
+    later rows get a clone of it, with new UUIDs. The cache can be shared
+    between the parsers of several sheets.
+
+    Only the max_size most recently used templates are kept. The cache only
+    pays off for sheets with many repeated rows, so parsers don't use one
+    unless it is given to them.
+    """
+
+    def __init__(self, max_size=1024):
+        self.templates = OrderedDict()
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_build(self, kind, row_key, build):
+        """
+        :param kind: What is built, e.g. 'action' or 'node'
+        :param row_key: The content of the row, see Parser.get_row_key
+        :param build: Function building the object, if there is no template yet
+        :return: The built object, or a clone of its template
+        """
+        template = self.templates.get((kind, row_key))
+        if template is not None:
+            self.templates.move_to_end((kind, row_key))
+            self.hits += 1
+            return template.clone()
+
+        self.misses += 1
+        built = build()
+        if built is not None:
+            # The template is a copy, as the built object is changed later on (e.g. linked)
+            self.templates[(kind, row_key)] = copy.deepcopy(built)
+            if len(self.templates) > self.max_size:
+                self.templates.popitem(last=False)
+                self.evictions += 1
+        return built
+
+    def clear(self):
+        self.templates = OrderedDict()
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'templates': len(self.templates),
+        }
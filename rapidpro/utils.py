@@ -1,8 +1,14 @@
 import csv
+import mmap
+import os
 import re
 import uuid
+from array import array
 from collections import defaultdict
+from collections.abc import Mapping
+from contextvars import ContextVar
 from enum import Enum
+from functools import lru_cache
 from pathlib import Path
 
 
@@ -11,39 +17,492 @@ class CellType(Enum):
     TEXT = 'text'
 
 
-def generate_new_uuid():
-    return str(uuid.uuid4())
+class HeaderType(Enum):
+    CONDITION = 'condition'
+    CHOICE = 'choice'
+    ATTACHMENT = 'attachment'
+    OBJECT = 'object'
+    UI = 'ui'
+    OTHER = 'other'
+
+
+ATTACHMENT_HEADERS = ['image', 'audio', 'video']
+OBJECT_HEADERS = ['obj_name', 'obj_id']
+UI_HEADERS = ['node_name', '_nodeId', '_ui_type', '_ui_position']
+
+numbered_header_pattern = re.compile(r'^(condition|choice):(\d+)')
+
+
+UUID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_DNS, 'rapidpro.idems.international')
+
+
+class UuidStrategy:
+    """
+    Base class of the UUID strategies.
+
+    A UUID can be reserved when its object is created and allocated when it
+    is first needed (see reserve_uuid). The reservation holds everything the
+    UUID depends on, so the UUID doesn't depend on when it is allocated.
+    """
+
+    def __deepcopy__(self, memo):
+        # Reservations refer to the strategy, which is shared by copies of the objects
+        return self
+
+    def reset(self):
+        # Called by Parser at the start of each compilation
+        pass
+
+    def reserve(self, role):
+        return None
+
+    def allocate(self, reservation):
+        raise NotImplementedError
+
+    def generate(self, role):
+        return self.allocate(self.reserve(role))
+
+
+class RandomUuidStrategy(UuidStrategy):
+    # A random (version 4) UUID for every object
+
+    def allocate(self, reservation):
+        return str(uuid.uuid4())
+
+
+class BulkRandomUuidStrategy(UuidStrategy):
+    # Random (version 4) UUIDs, drawing the random bytes for block_size UUIDs at a time.
+    # Every process draws its own UUIDs, so that copies of the strategy in
+    # other processes (e.g. the workers of compile_flows) never hand out the same ones.
+
+    def __init__(self, block_size=1024):
+        self.block_size = block_size
+        self._clear_uuids()
+
+    def __getstate__(self):
+        return {'block_size': self.block_size}
+
+    def __setstate__(self, state):
+        self.block_size = state['block_size']
+        self._clear_uuids()
+
+    def _clear_uuids(self):
+        self.uuids = iter(())
+        self.pid = os.getpid()
+
+    def allocate(self, reservation):
+        if self.pid != os.getpid():
+            # The strategy was copied into a forked process along with the UUIDs drawn so far
+            self._clear_uuids()
+        new_uuid = next(self.uuids, None)
+        if new_uuid is None:
+            random_bytes = os.urandom(16 * self.block_size)
+            self.uuids = iter([str(uuid.UUID(bytes=random_bytes[i:i + 16], version=4))
+                               for i in range(0, len(random_bytes), 16)])
+            new_uuid = next(self.uuids)
+        return new_uuid
+
+
+class DeterministicUuidStrategy(UuidStrategy):
+    """
+    Name-based (version 5) UUIDs, derived from the flow name, the row id and
+    the role of the object within its row.
+
+    Compiling the same sheet twice gives the same UUIDs, as long as the
+    objects are created in the same order. Objects with the same role in the
+    same row are numbered, so that they get different UUIDs. The name is
+    taken when the UUID is reserved, so UUIDs that are allocated lazily
+    don't depend on the order in which they are allocated.
+    """
+
+    def __init__(self, namespace=UUID_NAMESPACE):
+        self.namespace = namespace
+        self.reset()
 
+    def reset(self):
+        # Used for the objects that are created outside of a UuidScope
+        self.default_scope = UuidScope(None)
 
-def get_dict_from_csv(csv_file_path):
-    with open(f'{Path(__file__).parents[1].absolute()}/{csv_file_path}') as csv_file:
+    def reserve(self, role):
+        scope = current_uuid_scope.get() or self.default_scope
+        return scope.get_name(role)
+
+    def allocate(self, reservation):
+        return str(uuid.uuid5(self.namespace, reservation))
+
+
+class UuidScope:
+    """
+    The flow and row that new objects belong to, used by DeterministicUuidStrategy.
+
+    Use it as a context manager around the code that creates the objects.
+    The scopes of the rows of a flow are created with row(), and share
+    their counters with the scope of the flow.
+    """
+
+    def __init__(self, flow_name, row_id=None, counters=None):
+        self.flow_name = flow_name
+        self.row_id = row_id
+        self.counters = counters if counters is not None else defaultdict(int)
+        self.tokens = []
+
+    def row(self, row_id):
+        return UuidScope(self.flow_name, row_id, self.counters)
+
+    def get_name(self, role):
+        key = (self.row_id, role)
+        number = self.counters[key]
+        self.counters[key] += 1
+        return f'{self.flow_name}/{self.row_id}/{role}/{number}'
+
+    def __enter__(self):
+        self.tokens.append(current_uuid_scope.set(self))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        current_uuid_scope.reset(self.tokens.pop())
+
+
+current_uuid_scope = ContextVar('current_uuid_scope', default=None)
+current_uuid_strategy = ContextVar('current_uuid_strategy', default=RandomUuidStrategy())
+
+
+def set_uuid_strategy(strategy):
+    # Returns a token, which can be passed to reset_uuid_strategy to restore the previous strategy
+    return current_uuid_strategy.set(strategy)
+
+
+def reset_uuid_strategy(token):
+    current_uuid_strategy.reset(token)
+
+
+def generate_new_uuid(role=''):
+    """
+    :param role: What the UUID is for (e.g. 'node' or 'exit'), used by DeterministicUuidStrategy
+    """
+    return current_uuid_strategy.get().generate(role)
+
+
+def reserve_uuid(role=''):
+    # Returns a reservation to pass to allocate_uuid, which allocates the UUID with the current strategy
+    strategy = current_uuid_strategy.get()
+    return strategy, strategy.reserve(role)
+
+
+def allocate_uuid(reservation):
+    strategy, strategy_reservation = reservation
+    return strategy.allocate(strategy_reservation)
+
+
+def get_dict_from_csv(csv_file_path, memory_map=False):
+    return [row for row in iter_dict_from_csv(csv_file_path, memory_map)]
+
+
+def iter_dict_from_csv(csv_file_path, memory_map=False):
+    # Lazily yield the rows of the sheet, so that large sheets never have to
+    # be held in memory all at once.
+    if memory_map:
+        with MappedCsvFile(csv_file_path) as csv_file:
+            for row in csv_file:
+                # A copy, as the rows of a closed file can't be read
+                yield dict(row)
+        return
+
+    with open(get_csv_path(csv_file_path)) as csv_file:
         csv_reader = csv.DictReader(csv_file)
-        return [row for row in csv_reader]
+        for row in csv_reader:
+            yield row
+
+
+def get_csv_path(csv_file_path):
+    # Relative paths are relative to the root of the repository
+    return Path(__file__).parents[1].absolute() / csv_file_path
+
+
+class MappedCsvFile:
+    """
+    Read-only view of a csv file, backed by a memory map of the file.
+
+    Row boundaries are found with a quick pre-scan of the mapped bytes.
+    Like csv.DictReader, blank lines are skipped. The cells of a row are only
+    decoded when they are accessed, so reading a few columns of a wide sheet
+    does not decode the others. Rows can't be read once the file is closed.
+    """
+
+    def __init__(self, csv_file_path, encoding='utf-8'):
+        self.encoding = encoding
+
+        with open(get_csv_path(csv_file_path), 'rb') as csv_file:
+            # The map stays valid after the file is closed, until close is called.
+            # Empty files can't be mapped.
+            if os.fstat(csv_file.fileno()).st_size:
+                self._map = mmap.mmap(csv_file.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self._map = b''
+
+        self.row_starts, self.row_ends = self._scan_rows()
+
+        self.header = []
+        if self.row_starts:
+            header = MappedCsvRow(self, 0, None)
+            self.header = [header.get_cell(i) for i in range(len(header.get_raw_cells()))]
+        if self.header and self.header[0].startswith('\ufeff'):
+            self.header[0] = self.header[0][1:]
+        self.column_numbers = {name: i for i, name in enumerate(self.header)}
+
+    def _scan_rows(self):
+        # Rows end at a newline that is not inside a quoted cell, which is
+        # the case when an even number of quotes precede it in the row.
+        starts = array('Q')
+        ends = array('Q')
+        row_start = 0
+        position = 0
+        quote_count = 0
+        size = len(self._map)
+
+        while position < size:
+            newline = self._map.find(b'\n', position)
+            if newline == -1:
+                newline = size
+            quote = self._map.find(b'"', position, newline)
+            while quote != -1:
+                quote_count += 1
+                quote = self._map.find(b'"', quote + 1, newline)
+            position = newline + 1
+
+            if quote_count % 2 == 0:
+                if newline - row_start > 1 or self._map[row_start:newline] not in (b'', b'\r'):
+                    starts.append(row_start)
+                    ends.append(min(position, size))
+                row_start = position
+                quote_count = 0
+
+        if row_start < size:
+            # An unterminated quoted cell runs to the end of the file
+            starts.append(row_start)
+            ends.append(size)
+        return starts, ends
+
+    def get_raw_row(self, row_number):
+        # row_number 0 is the header row
+        return self._map[self.row_starts[row_number]:self.row_ends[row_number]].rstrip(b'\r\n')
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def column(self, column_name):
+        # Yield the values of a single column, without decoding other cells
+        for row in self:
+            yield row[column_name]
+
+    def __len__(self):
+        return max(len(self.row_starts) - 1, 0)
+
+    def __getitem__(self, index):
+        if not -len(self) <= index < len(self):
+            raise IndexError('Row index out of range')
+        return MappedCsvRow(self, index % len(self) + 1, self.column_numbers)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield MappedCsvRow(self, index + 1, self.column_numbers)
+
+
+class MappedCsvRow(Mapping):
+    # A single row of a MappedCsvFile, behaving like a csv.DictReader row.
+
+    def __init__(self, csv_file, row_number, column_numbers):
+        self.csv_file = csv_file
+        self.row_number = row_number
+        self.column_numbers = column_numbers
+        self._raw_cells = None
+        self._cells = None
+
+    def get_raw_cells(self):
+        if self._raw_cells is None:
+            raw_row = self.csv_file.get_raw_row(self.row_number)
+            if b'"' in raw_row:
+                # Quoted cells may contain separators, let the csv module handle them
+                line = raw_row.decode(self.csv_file.encoding)
+                self._cells = next(csv.reader([line]), [])
+                self._raw_cells = self._cells
+            else:
+                self._raw_cells = raw_row.split(b',') if raw_row else []
+                self._cells = [None] * len(self._raw_cells)
+        return self._raw_cells
+
+    def get_cell(self, column_number):
+        raw_cells = self.get_raw_cells()
+        if column_number >= len(raw_cells):
+            # Like csv.DictReader, missing trailing cells are None
+            return None
+
+        cell = self._cells[column_number]
+        if cell is None:
+            cell = raw_cells[column_number].decode(self.csv_file.encoding)
+            self._cells[column_number] = cell
+        return cell
+
+    def __getitem__(self, key):
+        return self.get_cell(self.column_numbers[key])
+
+    def __iter__(self):
+        return iter(self.column_numbers)
+
+    def __len__(self):
+        return len(self.column_numbers)
+
+
+@lru_cache(maxsize=None)
+def classify_column_header(header):
+    # Returns the HeaderType of the header and, for numbered headers like
+    # condition:1 and choice:10, its number (None otherwise)
+    match = numbered_header_pattern.search(header)
+    if match:
+        header_type = HeaderType.CONDITION if match.group(1) == 'condition' else HeaderType.CHOICE
+        return header_type, int(match.group(2))
+
+    if header in ATTACHMENT_HEADERS:
+        return HeaderType.ATTACHMENT, None
+    if header in OBJECT_HEADERS:
+        return HeaderType.OBJECT, None
+    if header in UI_HEADERS:
+        return HeaderType.UI, None
+    return HeaderType.OTHER, None
 
 
 def get_cell_type_for_column_header(header):
-    if re.search('^condition:(\d+)', header):
+    header_type, _ = classify_column_header(header)
+    if header_type == HeaderType.CONDITION:
         return CellType.OBJECT
 
     return CellType.TEXT
 
 
+# Separators of cell values, in order of precedence.
+# A separator preceded by ESCAPE_CHARACTER is part of the text. ESCAPE_CHARACTER
+# only escapes separators and itself, before any other character it is kept.
+SEPARATORS = ('|', ';', ':')
+ESCAPE_CHARACTER = '\\'
+
+separator_pattern = re.compile(r'\\([|;:\\])|([|;:])')
+
+
+class CellObject(dict):
+    # Immutable key/value pairs of an object cell (see get_object_from_cell_value).
+    # Missing keys read as '', like in a defaultdict(str).
+
+    def __missing__(self, key):
+        return ''
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError('CellObject is immutable')
+
+    __setitem__ = __delitem__ = __ior__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+    def __hash__(self):
+        return hash(frozenset(self.items()))
+
+    def __reduce__(self):
+        return CellObject, (dict(self),)
+
+
+@lru_cache(maxsize=4096)
+def tokenize_cell_value(value):
+    # Split value into text and separators in a single pass, e.g.
+    # 'a|b;c' -> ('a', '|', 'b', ';', 'c'). Text and separators alternate,
+    # starting and ending with text. Escape characters are removed.
+    tokens = []
+    text = []
+    position = 0
+    for match in separator_pattern.finditer(value):
+        escaped_character, separator = match.groups()
+        text.append(value[position:match.start()])
+        if separator:
+            tokens.append(''.join(text))
+            tokens.append(separator)
+            text = []
+        else:
+            text.append(escaped_character)
+        position = match.end()
+
+    text.append(value[position:])
+    tokens.append(''.join(text))
+    return tuple(tokens)
+
+
+def _get_token_separators(tokens):
+    found_separators = set(tokens[1::2])
+    return [s for s in SEPARATORS if s in found_separators]
+
+
+def _split_tokens(tokens, separator):
+    groups = [[]]
+    for token_number, token in enumerate(tokens):
+        if token_number % 2 and token == separator:
+            groups.append([])
+        else:
+            groups[-1].append(token)
+    return groups
+
+
+def _group_tokens(tokens, separators):
+    token_separators = tokens[1::2]
+    for separator_number, separator in enumerate(separators):
+        if separator in token_separators:
+            return tuple(_group_tokens(group, separators[separator_number + 1:])
+                         for group in _split_tokens(tokens, separator))
+    return ''.join(tokens)
+
+
 def get_separators(value):
-    # TODO: Discuss escape characters
-    separators = ['|', ';', ':']
+    found_separators = iter(_get_token_separators(tokenize_cell_value(value)))
+    return [next(found_separators, None) for _ in range(0, 3)]
+
+
+def split_cell_value(value):
+    # Split value on its separator with the highest precedence, e.g.
+    # '1;2' -> ('1', '2'). An empty value has no parts.
+    if not value:
+        return ()
+
+    tokens = tokenize_cell_value(value)
+    separators = _get_token_separators(tokens)
+    if not separators:
+        return tokens
+
+    return tuple(''.join(group) for group in _split_tokens(tokens, separators[0]))
 
-    found_separators = [s for s in separators if s in value]
-    iterator = iter(found_separators)
 
-    return [next(iterator, None) for _ in range(0, 3)]
+def parse_cell_value(value):
+    # Turn value into nested tuples, splitting on each separator it contains
+    # in order of precedence, e.g. 'a|b;c' -> ('a', ('b', 'c')).
+    tokens = tokenize_cell_value(value)
+    return _group_tokens(tokens, _get_token_separators(tokens))
 
 
+@lru_cache(maxsize=4096)
 def get_object_from_cell_value(value):
-    separator_1, separator_2, _ = get_separators(value)
-    obj = defaultdict(str)
+    # 'key_1;value_1|key_2;value_2' -> CellObject({'key_1': 'value_1', 'key_2': 'value_2'})
+    tokens = tokenize_cell_value(value)
+    separators = _get_token_separators(tokens)
+    if not separators:
+        return CellObject()
+    if len(separators) == 1:
+        # A single key/value pair
+        separators.insert(0, None)
+    separator_1, separator_2 = separators[:2]
 
-    members = value.split(separator_1)
-    for member in members:
-        key, value = member.split(separator_2)
+    obj = {}
+    for member in _split_tokens(tokens, separator_1):
+        key, value = (''.join(part) for part in _split_tokens(member, separator_2))
         obj[key] = value
-    return obj
+    return CellObject(obj)
@@ -0,0 +1,38 @@
+import json
+import re
+import unittest
+
+from rapidpro.batch import compile_flows
+
+UUID_PATTERN = re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}')
+
+
+def replace_uuids(export):
+    # Number the UUIDs in order of appearance, so that two compilations can be compared
+    uuids = {}
+    return UUID_PATTERN.sub(lambda match: uuids.setdefault(match.group(0), f'uuid_{len(uuids)}'), json.dumps(export))
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self) -> None:
+        self.csv_file_paths = [
+            'inputs/all_test_flows - _no_switch_nodes.csv',
+            'inputs/all_test_flows - _switch_nodes.csv',
+        ]
+
+    def test_compile_flows(self):
+        export = compile_flows(self.csv_file_paths)
+
+        self.assertEqual(['all_test_flows - _no_switch_nodes', 'all_test_flows - _switch_nodes'],
+                         [flow['name'] for flow in export['flows']])
+        self.assertEqual(5, len(export['flows'][0]['nodes']))
+
+    def test_flow_names_must_match_paths(self):
+        with self.assertRaises(ValueError):
+            compile_flows(self.csv_file_paths, flow_names=['a'])
+
+    def test_parallel_matches_serial(self):
+        serial_export = compile_flows(self.csv_file_paths, flow_names=['a', 'b'])
+        parallel_export = compile_flows(self.csv_file_paths, flow_names=['a', 'b'], max_workers=2)
+
+        self.assertEqual(replace_uuids(serial_export), replace_uuids(parallel_export))
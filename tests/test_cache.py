@@ -0,0 +1,99 @@
+import os
+import tempfile
+import unittest
+import uuid
+
+from rapidpro.batch import compile_flows
+from rapidpro.cache import CompileCache, get_file_key, get_sheet_key
+from rapidpro.utils import DeterministicUuidStrategy, get_dict_from_csv
+
+
+class TestCompileCache(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = CompileCache(self.tmp_dir.name)
+        self.csv_file_paths = [
+            'inputs/all_test_flows - _no_switch_nodes.csv',
+            'inputs/all_test_flows - _switch_nodes.csv',
+        ]
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_compile_flows(self):
+        export = compile_flows(self.csv_file_paths, cache=self.cache)
+        self.assertEqual({'hits': 0, 'misses': 2, 'evictions': 0}, self.cache.stats())
+
+        cached_export = compile_flows(self.csv_file_paths, cache=self.cache)
+        self.assertEqual({'hits': 2, 'misses': 2, 'evictions': 0}, self.cache.stats())
+        self.assertEqual(export, cached_export)
+
+    def test_sheet_key(self):
+        rows = get_dict_from_csv(self.csv_file_paths[0])
+        key = get_sheet_key(rows, 'flow')
+
+        # The order of the columns doesn't matter, but their contents and the flow name do
+        self.assertEqual(key, get_sheet_key([dict(reversed(row.items())) for row in rows], 'flow'))
+        self.assertNotEqual(key, get_sheet_key(rows, 'other_flow'))
+        edited_rows = [dict(row) for row in rows]
+        edited_rows[0]['message_text'] = 'edited'
+        self.assertNotEqual(key, get_sheet_key(edited_rows, 'flow'))
+
+    def test_eviction(self):
+        self.cache.put('a', {'name': 'a'})
+        self.cache.put('b', {'name': 'b'})
+        self.assertEqual({'name': 'a'}, self.cache.get('a'))
+
+        # Only two flows fit, and b is the least recently used
+        self.cache.max_size = 2 * len('{"name": "a"}')
+        self.cache.evict_ratio = 1
+        self.cache.put('c', {'name': 'c'})
+
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual({'name': 'a'}, self.cache.get('a'))
+        self.assertEqual({'name': 'c'}, self.cache.get('c'))
+        self.assertEqual(1, self.cache.stats()['evictions'])
+
+    def test_eviction_makes_room(self):
+        for key in 'abcd':
+            self.cache.put(key, {'name': key})
+        self.assertEqual(4 * len('{"name": "a"}'), self.cache.total_size)
+
+        # Flows are evicted until there is room for a few more, rather than one at a time
+        self.cache.max_size = 4 * len('{"name": "a"}')
+        self.cache.evict_ratio = 0.5
+        self.cache.put('e', {'name': 'e'})
+        self.assertEqual(3, self.cache.stats()['evictions'])
+        self.assertEqual([None, None, None], [self.cache.get(key) for key in 'abc'])
+        self.assertEqual(2 * len('{"name": "a"}'), self.cache.total_size)
+        self.assertEqual(self.cache.total_size, CompileCache(self.tmp_dir.name).total_size)
+
+    def test_failed_put(self):
+        with self.assertRaises(TypeError):
+            self.cache.put('a', {'name': object()})
+        self.assertEqual([], os.listdir(self.tmp_dir.name))
+        self.assertEqual(0, self.cache.total_size)
+
+    def test_file_key(self):
+        key = get_file_key(self.csv_file_paths[0], 'flow')
+        self.assertEqual(key, get_file_key(self.csv_file_paths[0], 'flow', chunk_size=7))
+        self.assertNotEqual(key, get_file_key(self.csv_file_paths[0], 'other_flow'))
+        self.assertNotEqual(key, get_file_key(self.csv_file_paths[1], 'flow'))
+
+        # Deterministic UUIDs depend on the namespace
+        namespace_keys = [get_file_key(self.csv_file_paths[0], 'flow', DeterministicUuidStrategy(namespace))
+                          for namespace in [uuid.NAMESPACE_DNS, uuid.NAMESPACE_URL]]
+        self.assertNotEqual(namespace_keys[0], namespace_keys[1])
+
+    def test_compile_flows_in_other_directory(self):
+        cwd = os.getcwd()
+        os.chdir(self.tmp_dir.name)
+        self.addCleanup(os.chdir, cwd)
+
+        compile_flows(self.csv_file_paths, cache=self.cache)
+        self.assertEqual(2, self.cache.stats()['misses'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,89 @@
+import copy
+import unittest
 
+from rapidpro.export import iter_flow_json
+from rapidpro.models.common import caching_renders, render_caching_enabled
+from rapidpro.models.routers import SwitchRouter
+from rapidpro.parser import Parser
+from rapidpro.utils import get_dict_from_csv
 
 
+class TestRenderCache(unittest.TestCase):
+
+    def setUp(self) -> None:
+        parser = Parser(None, sheet_rows=get_dict_from_csv('inputs/all_test_flows - _no_switch_nodes.csv'),
+                        flow_name='no_switch_node')
+        parser.parse()
+        self.container = parser.container
+
+        # Caching is opt-in
+        self.addCleanup(render_caching_enabled.reset, render_caching_enabled.set(True))
+
+    def test_render_is_cached(self):
+        render_output = self.container.render()
+        self.assertIs(render_output, self.container.render())
+
+    def test_only_changed_nodes_are_rendered_again(self):
+        render_output = self.container.render()
+        changed_node = self.container.nodes[2]
+        changed_node.update_default_exit('new_destination_uuid')
+
+        new_render_output = self.container.render()
+        self.assertIsNot(render_output, new_render_output)
+        for i, node_render_output in enumerate(new_render_output['nodes']):
+            if i == 2:
+                self.assertEqual('new_destination_uuid', node_render_output['exits'][0]['destination_uuid'])
+            else:
+                self.assertIs(render_output['nodes'][i], node_render_output)
+
+    def test_changes_to_actions(self):
+        self.container.render()
+        action = self.container.nodes[0].actions[0]
+        action.add_quick_reply('qr3')
+        self.assertEqual(['qr1', 'qr2', 'qr3'], self.container.render()['nodes'][0]['actions'][0]['quick_replies'])
+
+        action.text = 'new text'
+        action.invalidate()
+        self.assertEqual('new text', self.container.render()['nodes'][0]['actions'][0]['text'])
+
+        # Groups are shared between actions, which are all rendered again
+        group = self.container.nodes[2].actions[0].groups[0]
+        group.name = 'new group'
+        group.invalidate()
+        self.assertEqual(['new group', 'new group'],
+                         [node['actions'][0]['groups'][0]['name'] for node in self.container.render()['nodes'][2:4]])
+
+    def test_changes_to_routers(self):
+        router = SwitchRouter(operand='@input.text', result_name=None, wait_for_message=None)
+        router.add_choice('@input.text', 'has_any_word', ['a'], 'A', None)
+        self.assertEqual('@input.text', router.render()['operand'])
+
+        # The category and case exist already, only the operand changes
+        router.add_choice('@fields.x', 'has_any_word', ['a'], 'A', None)
+        self.assertEqual('@fields.x', router.render()['operand'])
+
+    def test_copies_are_rendered_separately(self):
+        self.container.render()
+        node = self.container.nodes[0]
+        node_copy = copy.deepcopy(node)
+        node_copy.uuid = 'new_uuid'
+
+        self.assertEqual('new_uuid', node_copy.render()['uuid'])
+        self.assertEqual(node.uuid, self.container.render()['nodes'][0]['uuid'])
+
+    def test_rendered_lists_are_copies(self):
+        render_output = self.container.render()
+        render_output['nodes'][0]['actions'][0]['quick_replies'].append('qr3')
+        self.assertEqual(['qr1', 'qr2'], self.container.nodes[0].actions[0].quick_replies)
+
+    def test_not_cached_by_default(self):
+        with caching_renders(False):
+            self.assertIsNot(self.container.render(), self.container.render())
+
+    def test_not_cached_when_streaming(self):
+        ''.join(iter_flow_json(self.container))
+        self.assertTrue(all(node._rendered is None for node in self.container.nodes))
+
+
+if __name__ == '__main__':
+    unittest.main()
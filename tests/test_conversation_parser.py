@@ -0,0 +1,30 @@
+import unittest
+
+from conversation_parser import compile_workbook
+from tests.test_batch import replace_uuids
+
+
+class TestConversationParser(unittest.TestCase):
+
+    def test_compile_all_flow_sheets(self):
+        export = compile_workbook('inputs/all_test_flows.xlsx')
+
+        self.assertEqual(
+            ['_loop_and_multiple_conditions', '_loop_from_start', '_no_switch_nodes', '_rejoin', '_switch_nodes'],
+            [flow['name'] for flow in export['flows']])
+        self.assertEqual('13', export['version'])
+
+    def test_compile_selected_sheets(self):
+        export = compile_workbook('inputs/all_test_flows.xlsx', ['_switch_nodes', '_no_switch_nodes'])
+
+        self.assertEqual(['_switch_nodes', '_no_switch_nodes'], [flow['name'] for flow in export['flows']])
+
+        no_switch_flow = export['flows'][1]
+        self.assertEqual(10, len(no_switch_flow['nodes']))
+        self.assertEqual('this is a send message node', no_switch_flow['nodes'][0]['actions'][0]['text'])
+
+    def test_parallel_matches_serial(self):
+        serial_export = compile_workbook('inputs/all_test_flows.xlsx')
+        parallel_export = compile_workbook('inputs/all_test_flows.xlsx', max_workers=2)
+
+        self.assertEqual(replace_uuids(serial_export), replace_uuids(parallel_export))
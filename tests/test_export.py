@@ -0,0 +1,50 @@
+import io
+import json
+import unittest
+
+from rapidpro.batch import get_export_detail
+from rapidpro.export import ExportWriter, write_flow
+from rapidpro.parser import Parser
+from rapidpro.utils import get_dict_from_csv
+
+
+class TestExport(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.containers = []
+        for csv_file_path in ['inputs/all_test_flows - _no_switch_nodes.csv',
+                              'inputs/all_test_flows - _switch_nodes.csv']:
+            parser = Parser(None, sheet_rows=get_dict_from_csv(csv_file_path), flow_name=csv_file_path)
+            parser.parse()
+            self.containers.append(parser.container)
+
+    def test_write_flow(self):
+        fp = io.StringIO()
+        write_flow(self.containers[0], fp)
+
+        self.assertEqual(json.dumps(self.containers[0].render()), fp.getvalue())
+
+    def test_export_writer(self):
+        group = {'name': 'test group', 'uuid': 'group_uuid'}
+        export_detail = get_export_detail([container.render() for container in self.containers])
+        export_detail['groups'] = [group]
+
+        fp = io.StringIO()
+        with ExportWriter(fp) as writer:
+            writer.add_flow(self.containers[0])
+            # Flows that are already rendered, e.g. from the cache, are written as they are
+            writer.add_flow(self.containers[1].render())
+            writer.add_group(group)
+
+        self.assertEqual(json.dumps(export_detail), fp.getvalue())
+
+    def test_empty_export(self):
+        fp = io.StringIO()
+        with ExportWriter(fp):
+            pass
+
+        self.assertEqual(json.dumps(get_export_detail([])), fp.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+
+from rapidpro.incremental import CompileState, IncrementalParser, recompile_flow
+from rapidpro.utils import get_dict_from_csv
+
+
+class TestIncremental(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.rows = get_dict_from_csv('inputs/all_test_flows - _no_switch_nodes.csv')
+
+    def compile(self, rows, state=None):
+        parser = IncrementalParser(None, sheet_rows=rows, flow_name='no_switch_node', state=state)
+        parser.parse()
+        return parser, parser.container.render()
+
+    def test_unchanged_sheet(self):
+        parser, render_output = self.compile(self.rows)
+        state = CompileState.from_dict(parser.get_state().to_dict())
+
+        parser, new_render_output = self.compile(self.rows, state)
+
+        self.assertEqual(render_output, new_render_output)
+        self.assertEqual([], parser.rebuilt_node_names)
+
+    def test_edited_row(self):
+        parser, render_output = self.compile(self.rows)
+
+        rows = [dict(row) for row in self.rows]
+        rows[4]['message_text'] = 'edited'
+        parser, new_render_output = self.compile(rows, parser.get_state())
+
+        self.assertEqual(1, len(parser.rebuilt_node_names))
+        self.assertEqual(render_output['uuid'], new_render_output['uuid'])
+
+        old_uuids = [node['uuid'] for node in render_output['nodes']]
+        new_uuids = [node['uuid'] for node in new_render_output['nodes']]
+        changed = [i for i, (old, new) in enumerate(zip(old_uuids, new_uuids)) if old != new]
+        self.assertEqual(1, len(changed))
+
+        # The node before the edited one keeps its UUIDs, and its exit points at the new node
+        old_parent_node = render_output['nodes'][changed[0] - 1]
+        new_parent_node = new_render_output['nodes'][changed[0] - 1]
+        self.assertEqual(old_parent_node['exits'][0]['uuid'], new_parent_node['exits'][0]['uuid'])
+        self.assertEqual(new_uuids[changed[0]], new_parent_node['exits'][0]['destination_uuid'])
+
+    def test_unchanged_nodes_are_reused(self):
+        parser, render_output = self.compile(self.rows)
+        old_nodes = list(parser.container.nodes)
+
+        rows = [dict(row) for row in self.rows]
+        rows[4]['message_text'] = 'edited'
+        parser, new_render_output = self.compile(rows, parser.get_state())
+
+        # Only the node of the edited row has been built again
+        new_nodes = parser.container.nodes
+        rebuilt = [i for i, (old, new) in enumerate(zip(old_nodes, new_nodes)) if old is not new]
+        self.assertEqual(1, len(rebuilt))
+        self.assertEqual(parser.rebuilt_node_names, [parser.get_node_name(rows[4])])
+        parent_exit = new_render_output['nodes'][rebuilt[0] - 1]['exits'][0]
+        self.assertEqual(new_nodes[rebuilt[0]].uuid, parent_exit['destination_uuid'])
+
+    def test_removed_row(self):
+        parser, _ = self.compile(self.rows)
+
+        # The node of the last row that is left no longer leads anywhere
+        parser, render_output = self.compile(self.rows[:-1], parser.get_state())
+        self.assertEqual([], parser.rebuilt_node_names)
+        self.assertIsNone(render_output['nodes'][-1]['exits'][0]['destination_uuid'])
+
+    def test_saved_state(self):
+        csv_file_path = 'inputs/all_test_flows - _no_switch_nodes.csv'
+        render_output, state = recompile_flow(csv_file_path)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            state_path = os.path.join(tmp_dir, 'state.json')
+            state.save(state_path)
+            new_render_output, _ = recompile_flow(csv_file_path, CompileState.load(state_path))
+
+        self.assertEqual(render_output, new_render_output)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,11 @@
 import unittest
 
 from rapidpro.models.actions import SendMessageAction
+from rapidpro.models.common import Exit
 from rapidpro.models.nodes import BasicNode
+from rapidpro.models.routers import RouterCategory
+from rapidpro.parser import Parser
+from rapidpro.utils import DeterministicUuidStrategy, get_dict_from_csv, set_uuid_strategy, reset_uuid_strategy
 
 
 class TestNodes(unittest.TestCase):
@@ -13,6 +17,72 @@ class TestNodes(unittest.TestCase):
 
         self.basic_node.update_default_exit('test_destination_uuid')
 
+    def test_slots(self):
+        # The models have no __dict__, to keep large flows small in memory
+        objects = [self.basic_node, self.basic_node.default_exit] + self.basic_node.actions
+        for obj in objects:
+            self.assertFalse(hasattr(obj, '__dict__'), type(obj).__name__)
+
+        with self.assertRaises(AttributeError):
+            self.basic_node.name = 'node'
+
+    def test_exit_reuse(self):
+        node = BasicNode()
+        node.update_default_exit(None)
+        exit = node.default_exit
+        # No UUID is allocated until the exit is used
+        self.assertIsNone(exit._uuid)
+
+        exit_uuid = node.render()['exits'][0]['uuid']
+        node.update_default_exit('test_destination_uuid')
+
+        self.assertIs(exit, node.default_exit)
+        self.assertEqual(exit_uuid, node.render()['exits'][0]['uuid'])
+        self.assertEqual('test_destination_uuid', node.render()['exits'][0]['destination_uuid'])
+
+    def test_lazy_exit_uuids(self):
+        category = RouterCategory('category', None)
+        self.assertIsNone(category._exit_uuid)
+        self.assertEqual(category.exit_uuid, category.get_exit().uuid)
+
+        # The UUID comes from the strategy of the time the exit was created
+        node = BasicNode()
+        node.update_default_exit(None)
+        token = set_uuid_strategy(DeterministicUuidStrategy())
+        try:
+            exit_uuid = node.default_exit.uuid
+        finally:
+            reset_uuid_strategy(token)
+        self.assertNotEqual(exit_uuid, DeterministicUuidStrategy().generate('exit'))
+
+    def test_lazy_exit_uuids_in_any_order(self):
+        # Deterministic exit UUIDs don't depend on the order in which they are allocated
+        def get_exit_uuids(reverse):
+            token = set_uuid_strategy(DeterministicUuidStrategy())
+            try:
+                parser = Parser(None, get_dict_from_csv('inputs/all_test_flows - _switch_nodes.csv'), 'switch_nodes')
+                parser.parse()
+                # Exits without an owner
+                exits = [Exit() for _ in range(3)]
+            finally:
+                reset_uuid_strategy(token)
+
+            nodes = parser.container.nodes
+            node_exit_uuids = {}
+            for node in reversed(nodes) if reverse else nodes:
+                node_exit_uuids[node.uuid] = [exit['uuid'] for exit in node.render()['exits']]
+            exit_uuids = [exit.uuid for exit in (reversed(exits) if reverse else exits)]
+            if reverse:
+                exit_uuids.reverse()
+            return [node_exit_uuids[node.uuid] for node in nodes], exit_uuids
+
+        node_exit_uuids, exit_uuids = get_exit_uuids(reverse=False)
+        self.assertEqual((node_exit_uuids, exit_uuids), get_exit_uuids(reverse=True))
+
+        all_exit_uuids = [uuid for uuids in node_exit_uuids for uuid in uuids] + exit_uuids
+        self.assertGreater(len(all_exit_uuids), len(node_exit_uuids))
+        self.assertEqual(len(all_exit_uuids), len(set(all_exit_uuids)))
+
     def test_basic_node(self):
         render_output = self.basic_node.render()
 
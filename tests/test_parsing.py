@@ -1,10 +1,13 @@
+import csv
 import json
+import os
+import tempfile
 import unittest
 
 from models import Row
 from rapidpro.parser import Parser
 from rapidpro.utils import get_dict_from_csv, get_cell_type_for_column_header, CellType, get_object_from_cell_value, \
-    get_separators
+    get_separators, iter_dict_from_csv, MappedCsvFile, split_cell_value, parse_cell_value
 
 
 class TestParsing(unittest.TestCase):
@@ -98,6 +101,108 @@ class TestParsing(unittest.TestCase):
 
         self.assertIsNone(node_4['exits'][0]['destination_uuid'])
 
+    def test_streaming_rows(self):
+        rows = iter_dict_from_csv('inputs/all_test_flows - _no_switch_nodes.csv')
+        parser = Parser(None, sheet_rows=rows, flow_name='no_switch_node', keep_rows=False)
+
+        nodes = parser.iter_parse()
+        first_node = next(nodes)
+        self.assertEqual(len(parser.row_id_to_node_map), 1)
+
+        remaining_nodes = list(nodes)
+        self.assertEqual(len(remaining_nodes), 4)
+        self.assertEqual(len(parser.sheet_map), 0)
+
+        render_output = parser.container.render()
+        self.assertEqual(len(render_output['nodes']), 5)
+        self.assertEqual(render_output['nodes'][0]['uuid'], first_node.uuid)
+        self.assertEqual(render_output['nodes'][0]['exits'][0]['destination_uuid'], remaining_nodes[0].uuid)
+
+    def test_streamed_nodes_are_linked(self):
+        rows = iter_dict_from_csv('inputs/all_test_flows - _no_switch_nodes.csv')
+        parser = Parser(None, sheet_rows=rows, flow_name='no_switch_node', keep_rows=False)
+        self.assertIsNone(parser.edge_index)
+
+        # Each node leads to the next one by the time the next one is yielded
+        previous_node = None
+        for node in parser.iter_parse():
+            if previous_node:
+                self.assertEqual(node.uuid, previous_node.render()['exits'][0]['destination_uuid'])
+            self.assertEqual({}, parser.forward_links)
+            previous_node = node
+
+    def test_rows_in_any_order(self):
+        # Rows 5 to 8 each have their own node, row 1 to 4 share one
+        parser = Parser(None, sheet_rows=list(reversed(self.no_switch_nodes_rows)), flow_name='no_switch_node')
+        parser.parse()
+
+        nodes = parser.row_id_to_node_map
+        for row_id, next_row_id in [('4', '5'), ('5', '6'), ('6', '7'), ('7', '8')]:
+            self.assertEqual(nodes[next_row_id].uuid, nodes[row_id].render()['exits'][0]['destination_uuid'])
+        self.assertIsNone(nodes['8'].render()['exits'][0]['destination_uuid'])
+
+    def test_merged_row_links_its_parents(self):
+        # Row 2 is added to the node of row 1, and the node of row 5 leads to it
+        rows = self.no_switch_nodes_rows
+        rows = [rows[0], dict(rows[4], **{'from': '1'}), dict(rows[1], **{'from': '5'})]
+        parser = Parser(None, sheet_rows=rows, flow_name='no_switch_node')
+        parser.parse()
+
+        nodes = parser.row_id_to_node_map
+        self.assertIs(nodes['1'], nodes['2'])
+        self.assertEqual(nodes['5'].uuid, nodes['1'].render()['exits'][0]['destination_uuid'])
+        self.assertEqual(nodes['2'].uuid, nodes['5'].render()['exits'][0]['destination_uuid'])
+
+    def test_missing_from_row(self):
+        rows = [dict(self.no_switch_nodes_rows[4], **{'from': '42'})]
+        parser = Parser(None, sheet_rows=rows, flow_name='no_switch_node')
+
+        with self.assertRaises(ValueError):
+            parser.parse()
+
+    def test_memory_mapped_rows(self):
+        rows = get_dict_from_csv('inputs/all_test_flows - _switch_nodes.csv', memory_map=True)
+        self.assertEqual(self.switch_node_rows, [dict(row) for row in rows])
+
+        csv_file = MappedCsvFile('inputs/all_test_flows - _switch_nodes.csv')
+        self.addCleanup(csv_file.close)
+        self.assertEqual(12, len(csv_file))
+        self.assertEqual(['start', '1;1', '2'], list(csv_file.column('from'))[:3])
+
+        # Only the cells that were accessed have been decoded
+        row = csv_file[1]
+        self.assertEqual('start_new_flow', row['type'])
+        self.assertEqual(1, len([cell for cell in row._cells if cell is not None]))
+
+    def test_memory_mapped_quoted_rows(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, newline='') as csv_file:
+            csv.writer(csv_file).writerows([
+                ['row_id', 'type', 'message_text'],
+                ['1', 'send_message', 'line one\nline two, with "quotes"'],
+                ['2', 'send_message', 'plain'],
+            ])
+        self.addCleanup(os.remove, csv_file.name)
+
+        rows = get_dict_from_csv(csv_file.name, memory_map=True)
+        self.assertEqual(2, len(rows))
+        self.assertEqual('line one\nline two, with "quotes"', rows[0]['message_text'])
+        self.assertEqual('plain', rows[1]['message_text'])
+
+    def test_memory_mapped_blank_lines(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, newline='') as csv_file:
+            csv_file.write('row_id,type\r\n1,send_message\r\n\r\n\n2,send_message\n,\n\n')
+        self.addCleanup(os.remove, csv_file.name)
+
+        # Like csv.DictReader, blank lines are skipped
+        self.assertEqual(get_dict_from_csv(csv_file.name), get_dict_from_csv(csv_file.name, memory_map=True))
+        self.assertEqual(['1', '2', ''], [row['row_id'] for row in get_dict_from_csv(csv_file.name, memory_map=True)])
+
+    def test_memory_mapped_file_is_closed(self):
+        with MappedCsvFile('inputs/all_test_flows - _switch_nodes.csv') as csv_file:
+            row = csv_file[0]
+        with self.assertRaises(ValueError):
+            row['type']
+
     def test_cell_type_from_condition_header(self):
         self.assertEqual(CellType.OBJECT, get_cell_type_for_column_header('condition:0'))
         self.assertEqual(CellType.OBJECT, get_cell_type_for_column_header('condition:1'))
@@ -134,6 +239,32 @@ class TestParsing(unittest.TestCase):
         self.assertEqual(':', s_2)
         self.assertIsNone(s_3)
 
+    def test_get_object_from_cell_value_is_immutable(self):
+        obj = get_object_from_cell_value('condition;a|condition_type;has_any_word')
+        self.assertEqual('', obj['condition_name'])
+        with self.assertRaises(TypeError):
+            obj['condition'] = 'b'
+
+    def test_escaped_separators(self):
+        s_1, s_2, s_3 = get_separators(r'a\|b;c')
+        self.assertEqual(';', s_1)
+        self.assertIsNone(s_2)
+
+        obj = get_object_from_cell_value(r'condition;a\;b|condition_name;A\|B')
+        self.assertDictEqual({'condition': 'a;b', 'condition_name': 'A|B'}, obj)
+
+    def test_split_cell_value(self):
+        self.assertEqual((), split_cell_value(''))
+        self.assertEqual(('start',), split_cell_value('start'))
+        self.assertEqual(('1', '1'), split_cell_value('1;1'))
+        self.assertEqual(('a;b', 'c'), split_cell_value(r'a\;b;c'))
+        self.assertEqual((r'a\nb', 'c\\'), split_cell_value(r'a\nb;c\\'))
+
+    def test_parse_cell_value(self):
+        self.assertEqual('a', parse_cell_value('a'))
+        self.assertEqual(('a', ('b', 'c')), parse_cell_value('a|b;c'))
+        self.assertEqual((('condition', 'a'), ('condition_name', 'A')), parse_cell_value('condition;a|condition_name;A'))
+
     def test_switch_node_rows(self):
         parser = Parser(None, sheet_rows=self.switch_node_rows, flow_name='switch_node')
         parser.parse()
@@ -16,6 +16,15 @@ class TestRouters(unittest.TestCase):
         self.random_router.add_choice('random_2', 'test_destination_2')
         self.random_router.add_choice('random_3', 'test_destination_3')
 
+    def test_exits_are_cached(self):
+        exits = self.switch_router.get_exits()
+        self.assertEqual([id(exit) for exit in exits], [id(exit) for exit in self.switch_router.get_exits()])
+
+        category = self.switch_router.categories[0]
+        category.destination_uuid = 'new_destination'
+        self.assertIs(exits[0], self.switch_router.get_exits()[0])
+        self.assertEqual('new_destination', exits[0].render()['destination_uuid'])
+
     def test_switch_router_render(self):
 
         render_output = self.switch_router.render()
@@ -50,3 +59,21 @@ class TestRouters(unittest.TestCase):
 
         for name in ['random_1', 'random_2', 'random_3']:
             self.assertIn(name, category_names)
+
+    def test_switch_router_indexes(self):
+        router = SwitchRouter(operand='@input.text', result_name=None, wait_for_message=None)
+        for i in range(200):
+            router.add_choice('@input.text', 'has_any_word', [f'word_{i}'], f'category_{i % 100}', f'destination_{i}')
+        # Adding the same choice again doesn't create a new case
+        router.add_choice('@input.text', 'has_any_word', ['word_0'], 'category_0', 'destination_0')
+        router.add_choice('@input.text', 'has_any_word', None, 'Other', 'other_destination', is_default=True)
+
+        render_output = router.render()
+
+        self.assertEqual([f'category_{i}' for i in range(100)] + ['Other'],
+                         [c['name'] for c in render_output['categories']])
+        self.assertEqual(200, len(render_output['cases']))
+        self.assertEqual([[f'word_{i}'] for i in range(200)], [c['arguments'] for c in render_output['cases']])
+        self.assertEqual(render_output['categories'][1]['uuid'], render_output['cases'][101]['category_uuid'])
+        self.assertEqual(render_output['categories'][-1]['uuid'], render_output['default_category_uuid'])
+        self.assertEqual('Other', router.default_category.name)
@@ -0,0 +1,39 @@
+import io
+import json
+import unittest
+
+from rapidpro.export import ExportWriter
+from rapidpro.parser import Parser
+from rapidpro.serializers import get_available_serializer_names, get_serializer
+from rapidpro.utils import get_dict_from_csv
+
+
+class TestSerializers(unittest.TestCase):
+
+    def setUp(self) -> None:
+        parser = Parser(None, sheet_rows=get_dict_from_csv('inputs/all_test_flows - _switch_nodes.csv'),
+                        flow_name='switch_nodes')
+        parser.parse()
+        self.container = parser.container
+
+    def test_export_writer(self):
+        for name in get_available_serializer_names():
+            serializer = get_serializer(name)
+            fp = io.StringIO()
+            with ExportWriter(fp, serializer=serializer) as writer:
+                writer.add_flow(self.container)
+                writer.add_flow(self.container.render())
+
+            # Each serializer writes the export in its own format, but the same JSON
+            self.assertEqual(serializer.dumps(json.loads(fp.getvalue())), fp.getvalue())
+            self.assertEqual([self.container.render()] * 2, json.loads(fp.getvalue())['flows'])
+
+    def test_get_serializer(self):
+        self.assertEqual('json', get_serializer().name)
+        self.assertEqual(get_available_serializer_names()[0], get_serializer('auto').name)
+        with self.assertRaises(ValueError):
+            get_serializer('pickle')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+
+from models import Row
+from rapidpro.parser import Parser
+from rapidpro.sheets import ColumnarSheet, HeaderIndex, EdgeIndex
+from rapidpro.utils import get_dict_from_csv, CellType
+
+
+class TestColumnarSheet(unittest.TestCase):
+    def setUp(self) -> None:
+        self.switch_node_rows = get_dict_from_csv('inputs/all_test_flows - _switch_nodes.csv')
+        self.sheet = ColumnarSheet.from_rows(self.switch_node_rows)
+
+    def test_rows(self):
+        self.assertEqual(12, len(self.sheet))
+        self.assertEqual(self.switch_node_rows, [dict(row) for row in self.sheet])
+        self.assertEqual(self.switch_node_rows[-1], dict(self.sheet[-1]))
+        self.assertEqual([row['from'] for row in self.switch_node_rows], list(self.sheet.column('from')))
+
+    def test_interned_strings(self):
+        # Repeated values are stored once, empty cells are not stored at all
+        self.assertEqual(1, self.sheet.strings.count('split_by_value'))
+        self.assertEqual(1, self.sheet.strings.count(''))
+        self.assertEqual(3, len(self.sheet.row_numbers[self.sheet.column_numbers['condition_var']]))
+
+    def test_row_views(self):
+        conditions = Row(self.sheet[1]).get_conditions()
+        self.assertEqual(['a', 'b'], [condition['condition'] for condition in conditions])
+
+        no_switch_nodes_rows = get_dict_from_csv('inputs/all_test_flows - _no_switch_nodes.csv')
+        parser = Parser(None, sheet_rows=ColumnarSheet.from_rows(no_switch_nodes_rows), flow_name='no_switch_node')
+        parser.parse()
+
+        render_output = parser.container.render()
+        self.assertEqual(5, len(render_output['nodes']))
+        self.assertIn('qr2', render_output['nodes'][0]['actions'][0]['quick_replies'])
+
+
+class TestHeaderIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        self.no_switch_nodes_rows = get_dict_from_csv('inputs/all_test_flows - _no_switch_nodes.csv')
+        self.header_index = HeaderIndex(['video', 'choice:10', 'condition:2', 'image', 'choice:2', 'condition:1',
+                                         'obj_id', '_ui_position', 'message_text'])
+
+    def test_header_index(self):
+        self.assertEqual(['condition:1', 'condition:2'], self.header_index.condition_columns)
+        self.assertEqual(['choice:2', 'choice:10'], self.header_index.choice_columns)
+        self.assertEqual(['image', 'video'], self.header_index.attachment_columns)
+        self.assertEqual(['obj_id'], self.header_index.object_columns)
+        self.assertEqual(['_ui_position'], self.header_index.ui_columns)
+        self.assertEqual(CellType.OBJECT, self.header_index.get_cell_type('condition:2'))
+        self.assertEqual(CellType.TEXT, self.header_index.get_cell_type('choice:10'))
+
+    def test_tenth_choice(self):
+        self.no_switch_nodes_rows[0]['choice:10'] = 'qr10'
+        parser = Parser(None, sheet_rows=self.no_switch_nodes_rows, flow_name='no_switch_node')
+        parser.parse()
+
+        render_output = parser.container.render()
+        self.assertEqual(['qr1', 'qr2', 'qr10'], render_output['nodes'][0]['actions'][0]['quick_replies'])
+
+
+class TestEdgeIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        self.edge_index = EdgeIndex()
+        for row in get_dict_from_csv('inputs/all_test_flows - _switch_nodes.csv'):
+            self.edge_index.add_row(row)
+
+    def test_children(self):
+        self.assertEqual(['2'], self.edge_index.get_children('1'))
+        self.assertEqual(['2'], self.edge_index.get_children('1', 'b'))
+        self.assertEqual(['9', '10'], self.edge_index.get_children('8'))
+        self.assertEqual(['10'], self.edge_index.get_children('8', '3'))
+        self.assertEqual(['11'], self.edge_index.get_children('7', ''))
+        self.assertEqual([], self.edge_index.get_children('8', '4'))
+
+    def test_parents(self):
+        self.assertEqual(['1'], self.edge_index.get_parents('2'))
+        self.assertEqual(['start'], self.edge_index.get_parents('1'))
+
+    def test_parser_lookup(self):
+        parser = Parser(None, sheet_rows=get_dict_from_csv('inputs/all_test_flows - _switch_nodes.csv'))
+        parser.parse()
+        self.assertEqual('12', parser._find_destination_node_row_id('2', 'Expired'))
+        self.assertIsNone(parser._find_destination_node_row_id('2', 'Missing'))
@@ -0,0 +1,69 @@
+import json
+import unittest
+
+from rapidpro.parser import Parser
+from rapidpro.templates import RowTemplateCache
+from rapidpro.utils import get_dict_from_csv, DeterministicUuidStrategy, set_uuid_strategy, reset_uuid_strategy
+from tests.test_batch import UUID_PATTERN, replace_uuids
+
+
+class TestRowTemplateCache(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.rows = get_dict_from_csv('inputs/all_test_flows - _no_switch_nodes.csv')
+
+    def parse(self, template_cache):
+        parser = Parser(None, sheet_rows=self.rows, flow_name='no_switch_node', template_cache=template_cache)
+        parser.parse()
+        return parser.container.render()
+
+    def test_shared_between_sheets(self):
+        template_cache = RowTemplateCache()
+        render_output = self.parse(template_cache)
+        misses = template_cache.stats()['misses']
+
+        new_render_output = self.parse(template_cache)
+        self.assertEqual(misses, template_cache.stats()['misses'])
+        self.assertEqual(misses, template_cache.stats()['hits'])
+
+        # The clones have the same content, but none of the UUIDs
+        self.assertEqual(replace_uuids(render_output), replace_uuids(new_render_output))
+        uuids = set(UUID_PATTERN.findall(json.dumps(render_output)))
+        new_uuids = set(UUID_PATTERN.findall(json.dumps(new_render_output)))
+        self.assertFalse(uuids & new_uuids)
+
+    def test_templates_dont_keep_flows_alive(self):
+        template_cache = RowTemplateCache()
+        for _ in range(5):
+            self.parse(template_cache)
+
+        # The groups of the templates are replaced by those of each sheet, which they don't keep track of
+        for template in template_cache.templates.values():
+            for group in getattr(template, 'groups', ()):
+                self.assertFalse(group._get_owners())
+
+    def test_size_limit(self):
+        template_cache = RowTemplateCache(max_size=2)
+        render_output = self.parse(template_cache)
+
+        self.assertEqual(2, template_cache.stats()['templates'])
+        self.assertLess(0, template_cache.stats()['evictions'])
+        self.assertEqual(replace_uuids(self.parse(None)), replace_uuids(render_output))
+
+    def test_same_uuids_as_without_templates(self):
+        template_cache = RowTemplateCache()
+        self.parse(template_cache)
+
+        outputs = []
+        for cache in [None, template_cache]:
+            token = set_uuid_strategy(DeterministicUuidStrategy())
+            try:
+                outputs.append(self.parse(cache))
+            finally:
+                reset_uuid_strategy(token)
+
+        self.assertEqual(outputs[0], outputs[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
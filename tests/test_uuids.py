@@ -0,0 +1,79 @@
+import json
+import unittest
+import uuid
+
+from rapidpro.batch import compile_flows
+from rapidpro.utils import BulkRandomUuidStrategy, DeterministicUuidStrategy, UuidScope, generate_new_uuid, \
+    set_uuid_strategy, reset_uuid_strategy
+
+
+class TestUuidStrategies(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.csv_file_paths = [
+            'inputs/all_test_flows - _no_switch_nodes.csv',
+            'inputs/all_test_flows - _switch_nodes.csv',
+        ]
+
+    def test_deterministic_exports_are_identical(self):
+        exports = [json.dumps(compile_flows(self.csv_file_paths, uuid_strategy=DeterministicUuidStrategy()))
+                   for _ in range(2)]
+        self.assertEqual(exports[0], exports[1])
+
+        # The strategy is passed on to the worker processes
+        parallel_export = compile_flows(self.csv_file_paths, max_workers=2, uuid_strategy=DeterministicUuidStrategy())
+        self.assertEqual(exports[0], json.dumps(parallel_export))
+
+    def test_deterministic_uuids(self):
+        token = set_uuid_strategy(DeterministicUuidStrategy())
+        try:
+            with UuidScope('flow').row('1'):
+                first_uuids = [generate_new_uuid('node'), generate_new_uuid('node'), generate_new_uuid('exit')]
+            with UuidScope('flow').row('1'):
+                self.assertEqual(first_uuids[0], generate_new_uuid('node'))
+            with UuidScope('flow').row('2'):
+                self.assertNotIn(generate_new_uuid('node'), first_uuids)
+        finally:
+            reset_uuid_strategy(token)
+
+        self.assertEqual(3, len(set(first_uuids)))
+        self.assertEqual(5, uuid.UUID(first_uuids[0]).version)
+
+    def test_bulk_random_uuids_in_several_processes(self):
+        strategy = BulkRandomUuidStrategy()
+        # Draw a block of UUIDs, which must not be passed on to the worker processes
+        strategy.generate('node')
+
+        export = compile_flows(self.csv_file_paths * 2, max_workers=2, uuid_strategy=strategy)
+
+        uuids = []
+        for flow in export['flows']:
+            uuids.append(flow['uuid'])
+            for node in flow['nodes']:
+                uuids.append(node['uuid'])
+                uuids.extend(obj['uuid'] for obj in node.get('actions', []) + node['exits'])
+        self.assertEqual(len(uuids), len(set(uuids)))
+
+    def test_reused_deterministic_strategy(self):
+        strategy = DeterministicUuidStrategy()
+        token = set_uuid_strategy(strategy)
+        try:
+            first_uuid = generate_new_uuid('node')
+        finally:
+            reset_uuid_strategy(token)
+
+        # Compiling with a strategy that has already been used gives the same UUIDs as with a new one
+        self.assertEqual(json.dumps(compile_flows(self.csv_file_paths, uuid_strategy=DeterministicUuidStrategy())),
+                         json.dumps(compile_flows(self.csv_file_paths, uuid_strategy=strategy)))
+        self.assertTrue(first_uuid)
+
+    def test_bulk_random_uuids(self):
+        strategy = BulkRandomUuidStrategy(block_size=8)
+        uuids = [strategy.generate('node') for _ in range(20)]
+
+        self.assertEqual(20, len(set(uuids)))
+        self.assertTrue(all(uuid.UUID(u).version == 4 for u in uuids))
+
+
+if __name__ == '__main__':
+    unittest.main()
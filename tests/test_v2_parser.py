@@ -0,0 +1,71 @@
+import io
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from conversation_parser_v2 import ReadSheetFromFile, RapidProParser
+from models import CompilationContext
+from utils import find_node, find_node_with_row_id_only
+
+SHEET = '''row_id,type,from,condition,message_text,media,choice_1,choice_2,choice_3,save_name
+1,send_message,start,,Do you like it?,,Yes,No,,
+2,send_message,1,Yes,Great,,,,,
+3,send_message,1,No,Too bad,,,,,
+4,send_message,2,,What is your name?,,,,,name
+5,send_message,4,,Thanks,,,,,
+'''
+
+
+def compile_sheet(path, context):
+    # The output goes to a buffer of its own, as redirecting sys.stdout isn't thread-safe
+    output = io.StringIO()
+    ReadSheetFromFile(path, context, output=output).read_csv()
+    return RapidProParser(context, output=output).run()
+
+
+class TestV2Parser(unittest.TestCase):
+    def setUp(self) -> None:
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as csv_file:
+            csv_file.write(SHEET)
+        self.path = csv_file.name
+        self.addCleanup(os.remove, self.path)
+
+    def test_run(self):
+        export = compile_sheet(self.path, CompilationContext())
+        nodes = export['flows'][0]['nodes']
+
+        texts = [node['actions'][0].get('text') for node in nodes if node.get('actions')]
+        self.assertEqual(['Do you like it?', 'Great', 'Too bad', 'What is your name?', None, 'Thanks'], texts)
+
+        router_node = nodes[1]
+        self.assertEqual(['All Responses', 'Yes', 'No'], [c['name'] for c in router_node['router']['categories']])
+        self.assertEqual(nodes[2]['uuid'], router_node['exits'][1]['destination_uuid'])
+        self.assertEqual(nodes[3]['uuid'], router_node['exits'][2]['destination_uuid'])
+
+    def test_separate_contexts(self):
+        context_1 = CompilationContext()
+        context_2 = CompilationContext()
+        compile_sheet(self.path, context_1)
+        compile_sheet(self.path, context_2)
+
+        self.assertEqual(5, len(context_2.nodes_map))
+        node_uuids_1 = {node.uuid for node in context_1.nodes_map.values()}
+        node_uuids_2 = {node.uuid for node in context_2.nodes_map.values()}
+        self.assertFalse(node_uuids_1 & node_uuids_2)
+
+    def test_concurrent_compilations(self):
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            exports = list(executor.map(lambda _: compile_sheet(self.path, CompilationContext()), range(8)))
+
+        for export in exports:
+            self.assertEqual(8, len(export['flows'][0]['nodes']))
+
+    def test_node_index(self):
+        context = CompilationContext()
+        ReadSheetFromFile(self.path, context).read_csv()
+
+        self.assertEqual('3', find_node(context.node_index, '1', 'No').row_id)
+        self.assertEqual('2', find_node_with_row_id_only(context.node_index, '1').row_id)
+        self.assertIsNone(find_node(context.node_index, '1', 'Maybe'))
+        self.assertEqual({'Yes', 'No'}, context.node_index.used_conditions)
@@ -1,21 +1,37 @@
-import uuid
+from collections import defaultdict
 
+from rapidpro.utils import generate_new_uuid
 
-def generate_uuid():
-    return str(uuid.uuid4())
 
+def generate_uuid(role=''):
+    # The UUIDs are generated with the strategy set in rapidpro.utils (see set_uuid_strategy)
+    return generate_new_uuid(role)
 
-def find_node(nodes_map, from_row_id, condition):
-    for _, node in nodes_map.items():
-        from_row_ids = node._from.split(';')
 
-        if (from_row_id in from_row_ids) and node.condition == condition:
-            return node
+class NodeIndex:
+    # Lookups of the nodes of a nodes_map by their _from row ids, built in a
+    # single pass over the nodes. Where several nodes match a lookup,
+    # the first one in nodes_map wins.
 
+    def __init__(self, nodes_map):
+        self.nodes_by_from_row_id = {}
+        self.nodes_by_from_row_id_and_condition = {}
+        self.nodes_by_from = defaultdict(list)
+        self.used_conditions = set()
 
-def find_node_with_row_id_only(nodes_map, from_row_id):
-    for _, node in nodes_map.items():
-        from_row_ids = node._from.split(';')
+        for _, node in nodes_map.items():
+            for from_row_id in node._from.split(';'):
+                self.nodes_by_from_row_id.setdefault(from_row_id, node)
+                self.nodes_by_from_row_id_and_condition.setdefault((from_row_id, node.condition), node)
 
-        if from_row_id in from_row_ids:
-            return node
+            self.nodes_by_from[node._from].append(node)
+            if node.condition:
+                self.used_conditions.add(node.condition)
+
+
+def find_node(node_index, from_row_id, condition):
+    return node_index.nodes_by_from_row_id_and_condition.get((from_row_id, condition))
+
+
+def find_node_with_row_id_only(node_index, from_row_id):
+    return node_index.nodes_by_from_row_id.get(from_row_id)